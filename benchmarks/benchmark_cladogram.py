@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+"""
+Time the cladogram branch transformation on generated trees.
+
+Caterpillar (fully unbalanced) and balanced trees are generated
+with a doubling number of leaves. If the transformation scales
+linearly, the time ratio between successive sizes is close to 2.
+"""
+
+__author__ = "Donovan Parks"
+__copyright__ = "Copyright 2016"
+__credits__ = ["Donovan Parks"]
+__license__ = "GPL3"
+__maintainer__ = "Donovan Parks"
+__email__ = "donovan.parks@gmail.com"
+__status__ = "Development"
+
+import sys
+import time
+import argparse
+
+import dendropy
+
+from drawm.tree.flat_tree import FlatTree
+from drawm.tree.branch_transform import cladogram
+
+
+def caterpillar_tree(num_leaves):
+    """Caterpillar tree where each internal node has a single leaf child."""
+
+    tree = dendropy.Tree()
+    node = tree.seed_node
+    for _ in xrange(num_leaves - 1):
+        node.new_child()
+        node = node.new_child()
+
+    return tree
+
+
+def balanced_tree(num_leaves):
+    """Balanced bifurcating tree."""
+
+    tree = dendropy.Tree()
+    stack = [(tree.seed_node, num_leaves)]
+    while stack:
+        node, count = stack.pop()
+        if count > 1:
+            half = count // 2
+            stack.append((node.new_child(), half))
+            stack.append((node.new_child(), count - half))
+
+    return tree
+
+
+def time_cladogram(tree, repeats):
+    """Best time to compute cladogram branch lengths for a tree."""
+
+    ft = FlatTree(tree)
+
+    best = None
+    for _ in xrange(repeats):
+        start = time.time()
+        cladogram(ft)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time cladogram branch transformation on trees of increasing size.')
+    parser.add_argument('--min_leaves', help='number of leaves in smallest tree', type=int, default=1000)
+    parser.add_argument('--max_leaves', help='number of leaves in largest tree', type=int, default=128000)
+    parser.add_argument('--repeats', help='number of times each tree is timed', type=int, default=3)
+    args = parser.parse_args()
+
+    shapes = [('caterpillar', caterpillar_tree), ('balanced', balanced_tree)]
+
+    print '%-12s %10s %12s %8s' % ('Tree', 'Leaves', 'Time (s)', 'Ratio')
+    for shape, build_tree in shapes:
+        prev_elapsed = None
+        num_leaves = args.min_leaves
+        while num_leaves <= args.max_leaves:
+            elapsed = time_cladogram(build_tree(num_leaves), args.repeats)
+
+            ratio = '-'
+            if prev_elapsed:
+                ratio = '%.2f' % (elapsed / prev_elapsed)
+            print '%-12s %10d %12.4f %8s' % (shape, num_leaves, elapsed, ratio)
+            sys.stdout.flush()
+
+            prev_elapsed = elapsed
+            num_leaves *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -17,11 +17,14 @@
 
 import os
 import sys
+import time
 import logging
 
 import dendropy
-import svgwrite
 
+from drawm.svg.svg_writer import create_drawing
+from drawm.svg.png_writer import PngWriter, pillow_available
+from drawm.svg.svg_utils import default_coordinate_precision
 from drawm.svg.bootstrap_props import BootstrapProps
 from drawm.svg.contour_props import ContourProps
 from drawm.svg.label_props import LabelProps
@@ -83,7 +86,15 @@ class DrawTree(object):
                 width, 
                 height,
                 dpi,
-                output_prefix):
+                output_prefix,
+                backend='stream',
+                merge_paths=False,
+                coordinate_precision=None,
+                element_ids=True,
+                output_format='svg',
+                compress_thread=False,
+                css_classes=False,
+                png_backend='pillow'):
         """Render tree.
         
         Parameters
@@ -100,6 +111,31 @@ class DrawTree(object):
           Resolution of image (dots per inch).
         output_prefix : str
           Prefix for output files.
+        backend : str
+          Drawing backend, either 'stream' to write elements as
+          they are rendered or 'svgwrite' to build the full
+          document in memory before writing it.
+        merge_paths : bool
+          Write branches, support values, and symbols with the
+          same style as a single compound path.
+        coordinate_precision : int
+          Number of decimal places written for coordinates. Coordinates 
+          are in pixels at the given resolution, so the precision is relative
+          to the size of a pixel. By default, this is the precision needed
+          to resolve a tenth of a pixel when printed at 600 DPI.
+        element_ids : bool
+          Write an id for each element.
+        output_format : str
+          Format of image, either 'svg' or gzip-compressed 'svgz'.
+        compress_thread : bool
+          Compress SVGZ image on a background thread.
+        css_classes : bool
+          Style elements with classes defined in a style sheet
+          rather than with attributes of each element.
+        png_backend : str
+          Create PNG image by rasterizing the drawing in-process
+          with 'pillow', by converting the SVG image with 'inkscape',
+          or not at all with 'none'.
         """
         
         tree_name = os.path.split(os.path.basename(input_tree))[0]
@@ -109,14 +145,31 @@ class DrawTree(object):
         canvas_height = height * dpi
         font_size = int(8 * (float(dpi)/90) + 0.5)
         
+        png_output = output_prefix + '.png'
+        png_writer = None
+        if png_backend == 'pillow':
+            if pillow_available():
+                png_writer = PngWriter(png_output, (canvas_width, canvas_height), dpi)
+            else:
+                self.logger.warning('Pillow is not installed so a PNG image will not be created.')
+        
         self.logger.info('Setting up SVG file.')
-        svg_output = output_prefix + '.svg'
-        dwg = svgwrite.Drawing(filename=svg_output, 
-                                    size=(canvas_width, canvas_height),
-                                    profile='full')
+        svg_output = output_prefix + '.' + output_format
+        dwg = create_drawing(backend,
+                                svg_output, 
+                                (canvas_width, canvas_height),
+                                compress=(output_format == 'svgz'),
+                                compress_thread=compress_thread,
+                                css_classes=css_classes,
+                                raster=png_writer)
         dwg.set_desc(title='DrawM rendering of %s' % tree_name, desc=tree_name)
         dwg.canvas_width = canvas_width
         dwg.canvas_height = canvas_height
+        dwg.merge_paths = merge_paths
+        if coordinate_precision is None:
+            coordinate_precision = default_coordinate_precision(dpi)
+        dwg.coordinate_precision = coordinate_precision
+        dwg.element_ids = element_ids
         
         background = "rgb(" + str(255) + "," + str(255) + "," + str(255) + ")"
         dwg.add(dwg.rect(insert=(0, 0), 
@@ -151,31 +204,51 @@ class DrawTree(object):
         # read and ladderize tree
         tree = tree_props.read_tree(input_tree)
         tree_props.layout(tree)
+        label_props.place_labels(tree, tree_props.collapsed_labels(tree))
 
         contour_props.decorate(tree)
         contour_props.render_contour(tree)
         contour_props.render_legend(tree)
         
+        # write out groups once rendered so the
+        # drawing need not be held in memory
+        dwg.flush()
+        
         lineage_props.render(tree)
+        dwg.flush()
    
         tree_props.render(tree)
         tree_props.render_scale_bar(tree)
         tree_props.render_scale_lines(tree)
+        dwg.flush()
         
         bootstrap_props.render(tree)
         bootstrap_props.render_legend(tree)
+        dwg.flush()
         
         label_props.render(tree)
+        dwg.flush()
         
         symbol_props.render(tree)
         
         self.logger.info('Saving SVG image.')
         dwg.save()
         
-        self.logger.info('Saving PNG image.')
-        png_output = output_prefix + '.png'
-        os.system('inkscape -e %s -d %d -z -w %d -h %d %s' % (png_output,
-                                                                dpi,
-                                                                dwg.canvas_width, 
-                                                                dwg.canvas_height, 
-                                                                svg_output))
\ No newline at end of file
+        if png_writer is not None and png_writer.error is not None:
+            self.logger.warning('Failed to rasterize PNG image: %s' % png_writer.error)
+        elif png_writer is not None:
+            self.logger.info('Saving PNG image.')
+            png_writer.save()
+            self.logger.info('Rasterized PNG image in %.2f s.' % png_writer.elapsed)
+        elif png_backend == 'inkscape':
+            self.logger.info('Saving PNG image.')
+            start = time.time()
+            rtn = os.system('inkscape -e %s -d %d -z -w %d -h %d %s' % (png_output,
+                                                                        dpi,
+                                                                        dwg.canvas_width, 
+                                                                        dwg.canvas_height, 
+                                                                        svg_output))
+            if rtn != 0:
+                self.logger.warning('Inkscape failed to create PNG image.')
+            else:
+                self.logger.info('Converted SVG to PNG image with Inkscape in %.2f s.' % (time.time() - start))
\ No newline at end of file
@@ -82,7 +82,15 @@ class OptionsParser():
                             options.width,
                             options.height,
                             options.dpi,
-                            options.output_prefix)
+                            options.output_prefix,
+                            options.backend,
+                            options.merge_paths,
+                            options.coordinate_precision,
+                            not options.no_ids,
+                            options.format,
+                            options.compress_thread,
+                            options.css_classes,
+                            options.png_backend)
         
     def reroot(self, options):
         """Reroot tree."""
@@ -29,10 +29,14 @@ import sys
 import math
 import logging
 
-import svgwrite
+from numpy import isnan as np_isnan
 
-from drawm.tree.newick_utils import parse_label
-from drawm.svg.svg_utils import render_label, color_str, rgb_from_str
+from drawm.svg.svg_utils import (render_label, 
+                                    color_str, 
+                                    rgb_from_str, 
+                                    circle_subpath, 
+                                    round_coords,
+                                    StyledPaths)
 
 
 class BootstrapProps:
@@ -144,13 +148,14 @@ class BootstrapProps:
             legendX = 0.1*self.inch
             legendY = self.dwg.canvas_height - self.inch - legend_height
 
-            bs_legend_group = svgwrite.container.Group(id='support_legend')
+            bs_legend_group = self.dwg.g(id='support_legend')
             self.dwg.add(bs_legend_group)
             for item_index, (support, color, node_radius) in enumerate(color_map):
                 legend_radius = node_radius
                 legend_step = max(2*legend_radius, 1.25*(self.font_size)) # 1.25 pixels/pt
             
-                c = self.dwg.circle(center=(legendX + max_radius, legendY), 
+                c = self.dwg.circle(center=round_coords((legendX + max_radius, legendY), 
+                                                            self.dwg.coordinate_precision), 
                                     r=legend_radius,
                                     id='support_legend_symbol_%d' % item_index)
                 c.fill(color=color)
@@ -176,19 +181,18 @@ class BootstrapProps:
         if not self.show_bootstraps:
             return
             
-        bs_node_group = svgwrite.container.Group(id='support_nodes')
+        bs_node_group = self.dwg.g(id='support_nodes')
         self.dwg.add(bs_node_group)
         
-        bs_text_group = svgwrite.container.Group(id='support_labels')
+        bs_text_group = self.dwg.g(id='support_labels')
         self.dwg.add(bs_text_group)
         
-        for node in tree.postorder_node_iter():
-            if node.is_collapsed:
-                continue
-                
-            support, _taxon, _auxiliary_info = parse_label(node.label)
-            if not support:
-                continue
+        # nodes with a non-zero support value that are not collapsed
+        ft = tree.flat
+        show_node = ~ft.is_collapsed & ~np_isnan(ft.support) & (ft.support != 0)
+        merged_nodes = StyledPaths()
+        for node_id in ft.postorder[show_node[ft.postorder]]:
+            support = ft.support[node_id]
             
             # get color
             color = None
@@ -205,37 +209,49 @@ class BootstrapProps:
             
             # render node
             if color:
-                node_x, node_y = node.x, node.y
-                if node.is_collapsed_root:
-                    node_x = node.x - node.x_dir*node_radius
-                    node_y = node.y - node.y_dir*node_radius
+                node_x, node_y = float(ft.x[node_id]), float(ft.y[node_id])
+                if ft.is_collapsed_root[node_id]:
+                    node_x -= float(ft.x_dir[node_id])*node_radius
+                    node_y -= float(ft.y_dir[node_id])*node_radius
                     
-                c = self.dwg.circle(center=(node_x, node_y), 
-                                    r=node_radius,
-                                    id='support_%g' % support)
-                c.stroke(color='black')
-                c.fill(color=color)
-                bs_node_group.add(c)
+                precision = self.dwg.coordinate_precision
+                if self.dwg.merge_paths:
+                    merged_nodes.add(circle_subpath(node_x, node_y, node_radius, precision),
+                                        fill=color,
+                                        stroke='black')
+                else:
+                    node_x, node_y, node_radius = round_coords((node_x, node_y, node_radius), precision)
+                    c = self.dwg.circle(center=(node_x, node_y), 
+                                        r=node_radius,
+                                        id='support_%g' % support)
+                    c.stroke(color='black')
+                    c.fill(color=color)
+                    bs_node_group.add(c)
                 
             if self.show_bootstrap_labels and support > self.min_bootstrap_label:
-                label_x = node.x + 0.5*(node.corner_x - node.x)
-                label_y = node.y + 0.5*(node.corner_y - node.y)
+                label_x = float(ft.x[node_id] + 0.5*(ft.corner_x[node_id] - ft.x[node_id]))
+                label_y = float(ft.y[node_id] + 0.5*(ft.corner_y[node_id] - ft.y[node_id]))
                 
+                angle = float(ft.angle[node_id])
                 offset = 0.5*tree.branch_width + 0.02*self.inch
-                if node.angle < 90 or node.angle > 270:
-                    label_x += (node.y_dir * offset)
-                    label_y -= (node.x_dir * offset)
+                x_dir, y_dir = float(ft.x_dir[node_id]), float(ft.y_dir[node_id])
+                if angle < 90 or angle > 270:
+                    label_x += (y_dir * offset)
+                    label_y -= (x_dir * offset)
                 else:
-                    label_x -= (node.y_dir * offset)
-                    label_y += (node.x_dir * offset)
+                    label_x -= (y_dir * offset)
+                    label_y += (x_dir * offset)
                         
                 render_label(self.dwg, 
                                 label_x, 
                                 label_y,
-                                node.angle, 
+                                angle, 
                                 '%g' % support, 
                                 self.font_size, 
                                 self.font_color,
                                 middle_x=True,
                                 group=bs_text_group,
-                                id_prefix='support_text')
+                                id_prefix='support_text',
+                                grid=tree.label_grid)
+                                
+        merged_nodes.render(self.dwg, bs_node_group, 'support_nodes')
@@ -29,9 +29,25 @@ import sys
 import logging
 import math
 
-import svgwrite
+from numpy import (array as np_array,
+                    zeros as np_zeros,
+                    empty as np_empty,
+                    arange as np_arange,
+                    cumsum as np_cumsum,
+                    repeat as np_repeat,
+                    unique as np_unique,
+                    lexsort as np_lexsort,
+                    searchsorted as np_searchsorted,
+                    flatnonzero as np_flatnonzero,
+                    isnan as np_isnan,
+                    inf as np_inf)
 
-from drawm.svg.svg_utils import donut, render_label
+from drawm.svg.svg_utils import donut, render_label, format_path_data, round_coords
+from drawm.svg.geometry import simplify_polyline
+from drawm.tree.tree_utils import (find_nodes, 
+                                    mean_tip_dist, 
+                                    relative_divergence,
+                                    interpolate_node_values)
 
 
 class ContourProps:
@@ -47,6 +63,7 @@ class ContourProps:
 
         self.show_contours = False
         self.contour_width = None
+        self.path_tolerance = 0
         self.contour_file = None
         self.show_legend = False
         self.font_size = 10
@@ -73,12 +90,14 @@ class ContourProps:
                     self.show_contours = (values[0] == 'True')
                 elif attribute == 'contour_method':
                     self.contour_method = values[0]
-                    assert (self.contour_method in ['CONCENTRIC', 'BY_FILE'])
+                    assert (self.contour_method in ['CONCENTRIC', 'BY_FILE', 'MEAN_TIP_BL', 'RED'])
                 elif attribute == 'contour_file':
                     self.contour_file = os.path.join(os.path.split(config_file)[0], 
                                                         values[0])
                 elif attribute == 'contour_width':
                     self.contour_width = float(values[0])
+                elif attribute == 'path_tolerance':
+                    self.path_tolerance = float(values[0])
                 elif attribute == 'show_legend':
                     self.show_legend = (values[0] == 'True')
                 elif attribute == 'font_size':
@@ -97,27 +116,54 @@ class ContourProps:
         if not self.show_contours:
             return
             
+        if self.contour_method == 'MEAN_TIP_BL':
+            self.logger.info('Decorating tree with mean branch length to extant taxa.')
+            tree.flat.contour[:] = mean_tip_dist(tree)
+            return
+            
+        if self.contour_method == 'RED':
+            self.logger.info('Decorating tree with relative evolutionary divergence.')
+            tree.flat.contour[:] = relative_divergence(tree)
+            return
+            
         if self.contour_method != 'BY_FILE':
             return
             
         self.logger.info('Decorating tree with contour information.')
 
-        contours = {}
-        for line in open(self.contour_file):
-            if line[0] == '#':
-                continue
-
-            line_split = line.strip().split('\t')
-            taxa = line_split[0]
-            contour_value = float(line_split[1])
+        taxa = []
+        contour_values = []
+        for taxon, contour_value in self._read_contour_file(self.contour_file):
+            taxa.append(taxon)
+            contour_values.append(contour_value)
             
-            if '|' in taxa:
-                node = tree.mrca(taxon_labels=taxa.split('|'))
-            else:
-                # specified leaf node
-                node = tree.find_node_with_taxon_label(taxa)
-                            
-            node.contour = contour_value
+        # resolve all nodes in a single batch
+        ft = tree.flat
+        node_ids = find_nodes(tree, taxa)
+        contour_values = np_array(contour_values, dtype=float)
+        
+        found = (node_ids != -1)
+        if not found.all():
+            self.logger.warning('Failed to identify %d nodes in contour file.' % (len(found) - found.sum()))
+            
+        ft.contour[node_ids[found]] = contour_values[found]
+        
+        # fill in nodes not specified in the contour file
+        num_missing = np_isnan(ft.contour).sum()
+        if num_missing:
+            self.logger.info('Interpolating contour values for %d nodes.' % num_missing)
+            ft.contour[:] = interpolate_node_values(tree, ft.contour)
+            
+    def _read_contour_file(self, contour_file):
+        """Read label and contour value from each line of contour file."""
+        
+        with open(contour_file) as f:
+            for line in f:
+                if line[0] == '#' or not line.strip():
+                    continue
+                    
+                line_split = line.strip().split('\t')
+                yield line_split[0], float(line_split[1])
         
     def render_legend(self, tree):
         """Render legend."""
@@ -131,12 +177,13 @@ class ContourProps:
         legendX = 0.1*self.inch
         legendY = 0.1*self.inch
         
-        legend_group = svgwrite.container.Group(id='contour_legend',
-                                                    style='font-family:Arial')
+        legend_group = self.dwg.g(id='contour_legend',
+                                    style='font-family:Arial')
         self.dwg.add(legend_group)
 
         for item_index, (outer_threshold, inner_threshold, color, alpha, label) in enumerate(self.contour_cm):
-            c = self.dwg.circle(center=(legendX + legend_radius, legendY), 
+            c = self.dwg.circle(center=round_coords((legendX + legend_radius, legendY), 
+                                                    self.dwg.coordinate_precision), 
                                 r=legend_radius,
                                 id='contour_legend_symbol_%d' % item_index)
             c.fill(color=color, opacity=alpha)
@@ -155,98 +202,156 @@ class ContourProps:
                 
             legendY += legend_step
             
-    def _contour_pts(self, tree, contour_threshold, draw_threshold=None):
-        """Get points defining contour."""
+    def _contour_pts(self, tree, thresholds):
+        """Get points defining contours at a set of thresholds.
         
-        if not draw_threshold:
-            draw_threshold = contour_threshold
-            
-        # determine direction of contour
-        descending = tree.seed_node.contour > tree.leaf_node_iter().next().contour
+        A contour crosses the branch above the first node along each 
+        path from the root whose contour value reaches the threshold. 
+        The range of thresholds crossing the branch above each node is
+        found in a single pass over the tree, and points for all 
+        thresholds are then calculated together.
+        
+        Parameters
+        ----------
+        tree : Tree
+          Tree decorated with contour values.
+        thresholds : iterable
+          Contour thresholds.
+          
+        Returns
+        -------
+        dict : float -> (list, list)
+          Points defining contour, and node associated 
+          with each point, for each threshold.
+        """
+        
+        ft = tree.flat
+        
+        # orient contour values so they decrease away from the root
+        sign = 1.0
+        if not ft.contour[0] > ft.contour[ft.leaves[0]]:
+            sign = -1.0
+        contour = sign * ft.contour
         
-        pts = []
-        nodes = []
-        stack = [tree.seed_node]
-        while stack:
-            node = stack.pop()
+        # nodes are reached by all thresholds below the smallest contour
+        # value of their ancestors, excluding the root, and nodes below
+        # an undefined contour value are never reached
+        reached_below = [np_inf] * ft.num_nodes
+        if np_isnan(contour[0]):
+            reached_below = [-np_inf] * ft.num_nodes
             
-            if node.contour == None:
-                # nodes below this will also have undefined
-                # contour values
+        parent = ft.parent.tolist()
+        contour_list = contour.tolist()
+        for node_id in xrange(1, ft.num_nodes):
+            p = parent[node_id]
+            if p == 0:
                 continue
-             
-            # check if node meets contouring criterion
-            if (node == tree.seed_node 
-                or (descending and node.contour > contour_threshold)
-                or (not descending and node.contour < contour_threshold)):
-                # node is below threshold so add children
-                for c in node.child_node_iter():
-                    stack.append(c)
-                continue
-            else:
-                # first node in lineage above threhold so
-                # draw contour along this branch
-                bl = node.contour
-                pbl = node.parent_node.contour
                 
-                index = 0
-                if bl != pbl:
-                    index = float(bl - draw_threshold) / (bl - pbl)
-
-                x = node.x + index * (node.corner_x - node.x)
-                y = node.y + index * (node.corner_y - node.y)
-                    
-                pts.append((x, y))
-                nodes.append(node)
+            parent_contour = contour_list[p]
+            if np_isnan(parent_contour):
+                reached_below[node_id] = -np_inf
+            else:
+                reached_below[node_id] = min(reached_below[p], parent_contour)
+        
+        # a contour crosses the branch above each node for all thresholds 
+        # reaching the node that are at or above its contour value 
+        reached_below = np_array(reached_below)
+        reached_below[0] = -np_inf
+        crossed = np_flatnonzero(contour < reached_below)
+        
+        thresholds = list(thresholds)
+        sorted_thresholds = np_unique(sign * np_array(thresholds, dtype=float))
+        first = np_searchsorted(sorted_thresholds, contour[crossed])
+        last = np_searchsorted(sorted_thresholds, reached_below[crossed])
+        
+        # expand into a crossing for each node and threshold
+        num_crossings = last - first
+        node_ids = np_repeat(crossed, num_crossings)
+        crossing_start = np_cumsum(num_crossings) - num_crossings
+        threshold_index = (np_arange(num_crossings.sum()) 
+                            - np_repeat(crossing_start, num_crossings)
+                            + np_repeat(first, num_crossings))
+                            
+        # points along each contour are ordered as in a preorder traversal 
+        # visiting children from last to first, which is reverse postorder
+        post_rank = np_empty(ft.num_nodes, dtype=int)
+        post_rank[ft.postorder] = np_arange(ft.num_nodes)
+        order = np_lexsort((-post_rank[node_ids], threshold_index))
+        node_ids = node_ids[order]
+        threshold_index = threshold_index[order]
+        
+        # interpolate position of crossing along branch
+        threshold = sorted_thresholds[threshold_index]
+        bl = contour[node_ids]
+        pbl = contour[ft.parent[node_ids]]
+        index = np_zeros(len(node_ids))
+        diff = (bl != pbl)
+        index[diff] = (bl[diff] - threshold[diff]) / (bl[diff] - pbl[diff])
+        
+        x = ft.x[node_ids] + index * (ft.corner_x[node_ids] - ft.x[node_ids])
+        y = ft.y[node_ids] + index * (ft.corner_y[node_ids] - ft.y[node_ids])
+        
+        contour_pts = {}
+        bounds = np_searchsorted(threshold_index, np_arange(len(sorted_thresholds) + 1))
+        for t in thresholds:
+            k = np_searchsorted(sorted_thresholds, sign * t)
+            start, end = bounds[k], bounds[k+1]
+            contour_pts[t] = (zip(x[start:end], y[start:end]), list(node_ids[start:end]))
                 
-        return pts, nodes
+        return contour_pts
         
-    def _contour_by_file(self, tree):
-        """Draw contour based on node information in file."""
+    def _contour_by_node_value(self, tree):
+        """Draw contour based on contour value of each node."""
         
-        contour_group = svgwrite.container.Group(id='contour')
+        contour_group = self.dwg.g(id='contour')
         self.dwg.add(contour_group)
         
+        # find points for all contour bands in a single batch
+        thresholds = set()
+        for outer_threshold, inner_threshold, _color, _alpha, _label in self.contour_cm:
+            thresholds.update([outer_threshold, inner_threshold])
+        contour_pts = self._contour_pts(tree, thresholds)
+        
         for index, (outer_threshold, inner_threshold, color, alpha, label) in enumerate(self.contour_cm): 
-            outer_pts, outer_nodes = self._contour_pts(tree, outer_threshold)
-            cheaty_inner_pts, cheaty_inner_nodes = self._contour_pts(tree, outer_threshold, inner_threshold)
-            inner_pts, inner_nodes = self._contour_pts(tree, inner_threshold)
-
-            # draw outer contour
-            path = self.dwg.path("M%f,%f" % outer_pts[0], id='contour_%d' % index)
-            path.fill(color=color, opacity=alpha, rule='evenodd')
-            path.stroke(color=color, width=self.contour_width)
+            outer_pts, outer_nodes = contour_pts[outer_threshold]
+            inner_pts, inner_nodes = contour_pts[inner_threshold]
+            
+            outer_pts = simplify_polyline(outer_pts, self.path_tolerance)
+            inner_pts = simplify_polyline(inner_pts, self.path_tolerance)
 
-            for pt in outer_pts[1:]:
-                path.push("L%f,%f" % pt)
-                   
-            # draw inner ring of contour
-            path.push("L%f,%f" % inner_pts[-1])
-            for pt in inner_pts[::-1]:
-                path.push("L%f,%f" % pt)
+            # draw outer contour, followed by inner ring of contour
+            ring_pts = outer_pts[1:] + [inner_pts[-1]] + inner_pts[::-1]
                 
             # this improves the visual quality for trees that
             # only have deep nodes near the end of the tree
-            angle_rad = math.radians(outer_nodes[0].angle)
-            visual_x = inner_nodes[0].rel_depth * math.cos(angle_rad) + 0.5*self.dwg.canvas_width
-            visual_y = inner_nodes[0].rel_depth * math.sin(angle_rad) + 0.5*self.dwg.canvas_height
-            path.push("L%f,%f" % (visual_x,visual_y))
+            angle_rad = math.radians(tree.flat.angle[outer_nodes[0]])
+            inner_rel_depth = tree.flat.rel_depth[inner_nodes[0]]
+            visual_x = inner_rel_depth * math.cos(angle_rad) + 0.5*self.dwg.canvas_width
+            visual_y = inner_rel_depth * math.sin(angle_rad) + 0.5*self.dwg.canvas_height
+            ring_pts.append((visual_x, visual_y))
 
             # connect the inner and outer contours
-            path.push("L%f,%f" % outer_pts[0])
+            ring_pts.append(outer_pts[0])
+            
+            precision = self.dwg.coordinate_precision
+            path = self.dwg.path(format_path_data('M%f,%f', [outer_pts[0]], precision)[0], 
+                                    id='contour_%d' % index)
+            path.fill(color=color, opacity=alpha, rule='evenodd')
+            path.stroke(color=color, width=self.contour_width)
+            path.push(*format_path_data('L%f,%f', ring_pts, precision))
                 
             contour_group.add(path)
         
     def _contour_concentric(self, tree):
         """Draw concentric contours using branch length."""
         
-        contour_group = svgwrite.container.Group(id='contour')
+        contour_group = self.dwg.g(id='contour')
         self.dwg.add(contour_group)
         
         for index, (outer_threshold, inner_threshold, color, alpha, label) in enumerate(self.contour_cm):
             if tree.display_method == 'CIRCULAR':
                 donut(self.dwg, 
-                        tree.seed_node.x, tree.seed_node.x, 
+                        tree.flat.x[0], tree.flat.x[0], 
                         inner_threshold*tree.height, outer_threshold*tree.height, 
                         color, opacity=alpha, 
                         group=contour_group, id='contour_%d' % index)
@@ -254,8 +359,11 @@ class ContourProps:
                 border_x = 0.5*(self.dwg.canvas_width - tree.width)
                 border_y = 0.5*(self.dwg.canvas_height - tree.height)
                 
-                p = self.dwg.rect((border_x+inner_threshold*tree.width, border_y), 
-                                    ((outer_threshold-inner_threshold)*tree.width,tree.height), 
+                insert, size = round_coords([(border_x+inner_threshold*tree.width, border_y), 
+                                                ((outer_threshold-inner_threshold)*tree.width, tree.height)], 
+                                                self.dwg.coordinate_precision)
+                p = self.dwg.rect(insert, 
+                                    size, 
                                     id='contour_%d' % index)
                 p.fill(color=color, opacity=alpha)
                 contour_group.add(p)
@@ -268,11 +376,11 @@ class ContourProps:
             
         self.logger.info('Rendering contours.')
             
-        contour_group = svgwrite.container.Group(id='contour')
+        contour_group = self.dwg.g(id='contour')
         self.dwg.add(contour_group)
         
-        if self.contour_method == 'BY_FILE':
-            self._contour_by_file(tree)
+        if self.contour_method in ['BY_FILE', 'MEAN_TIP_BL', 'RED']:
+            self._contour_by_node_value(tree)
         elif self.contour_method == 'CONCENTRIC':
             self._contour_concentric(tree)
 
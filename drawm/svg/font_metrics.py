@@ -0,0 +1,109 @@
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = 'Donovan Parks'
+__copyright__ = 'Copyright 2016'
+__credits__ = ['Donovan Parks']
+__license__ = 'GPL3'
+__version__ = '0.0.1'
+__maintainer__ = 'Donovan Parks'
+__email__ = 'donovan.parks@gmail.com'
+__status__ = 'Development'
+
+# advance widths in 1/1000 em of printable ASCII characters (' ' to '~')
+# taken from the Adobe font metrics of Helvetica, which Arial and most
+# default sans-serif fonts closely follow
+GLYPH_WIDTHS = {'sans-serif': [278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 
+                                389, 584, 278, 333, 278, 278, 556, 556, 556, 556, 
+                                556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 
+                                584, 556, 1015, 667, 667, 722, 722, 667, 611, 778, 
+                                722, 278, 500, 667, 556, 833, 722, 778, 667, 778, 
+                                722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 
+                                278, 278, 469, 556, 333, 556, 556, 500, 556, 556, 
+                                278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 
+                                556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 
+                                500, 334, 260, 334, 584]}
+                                
+# width of characters missing from metrics table, in 1/1000 em
+DEFAULT_GLYPH_WIDTH = 556
+
+DEFAULT_FONT = 'sans-serif'
+
+# font size is given in points, where 1pt = 1.25 user units
+PT_TO_USER_UNITS = 1.25
+
+
+class FontMetrics(object):
+    """Measure extent of text from glyph advance widths.
+    
+    Advance widths are read from the metrics table once per font and
+    widths of text are memoized in em units, so measuring a label at
+    any font size after its first use is a dictionary lookup.
+    """
+    
+    def __init__(self):
+        """Initialize empty caches."""
+        
+        self.advance_widths = {}
+        self.text_widths = {}
+        
+    def _advance_widths(self, font):
+        """Advance width of each character in a font, in em."""
+        
+        if font not in self.advance_widths:
+            widths = GLYPH_WIDTHS[font]
+            self.advance_widths[font] = dict((chr(ord(' ') + i), w / 1000.0) 
+                                                for i, w in enumerate(widths))
+                                                
+        return self.advance_widths[font]
+        
+    def em_width(self, text, font=DEFAULT_FONT):
+        """Width of text in em."""
+        
+        key = (font, text)
+        width = self.text_widths.get(key)
+        if width is None:
+            advance_widths = self._advance_widths(font)
+            default_width = DEFAULT_GLYPH_WIDTH / 1000.0
+            width = sum(advance_widths.get(c, default_width) for c in text)
+            self.text_widths[key] = width
+            
+        return width
+        
+    def text_width(self, text, font_size, font=DEFAULT_FONT):
+        """Width of text.
+        
+        Parameters
+        ----------
+        text : str
+          Text to measure.
+        font_size : float
+          Size of font in points.
+        font : str
+          Font family in metrics table.
+          
+        Returns
+        -------
+        float
+          Width of text in user units.
+        """
+        
+        return self.em_width(text, font) * font_size * PT_TO_USER_UNITS
+
+
+# metrics shared by all properties
+font_metrics = FontMetrics()
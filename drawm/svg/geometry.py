@@ -26,6 +26,18 @@ __status__ = 'Development'
 
 import math
 
+from numpy import (array as np_array,
+                    asarray as np_asarray,
+                    zeros as np_zeros,
+                    hypot as np_hypot,
+                    floor as np_floor,
+                    diff as np_diff,
+                    flatnonzero as np_flatnonzero,
+                    concatenate as np_concatenate,
+                    maximum as np_maximum,
+                    ones as np_ones,
+                    column_stack as np_column_stack)
+
 
 def polygon_centroid(pts):
     """Calculate centroid for polygon."""
@@ -54,6 +66,96 @@ def polygon_centroid(pts):
     
     return c_x, c_y
 
+
+
+def simplify_polyline(pts, tolerance):
+    """Simplify polyline with the Douglas-Peucker algorithm.
+    
+    Parameters
+    ----------
+    pts : list of (x, y)
+      Points along polyline.
+    tolerance : float
+      Maximum distance of a removed point from the simplified polyline.
+      
+    Returns
+    -------
+    list of (x, y)
+      Points along simplified polyline, which always 
+      includes the first and last point.
+    """
+    
+    if tolerance <= 0 or len(pts) < 3:
+        return list(pts)
+        
+    pts = np_array(pts, dtype=float)
+    keep = np_zeros(len(pts), dtype=bool)
+    keep[0] = keep[-1] = True
+    
+    stack = [(0, len(pts) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+            
+        # distance of intermediate points from segment joining end points
+        seg_x, seg_y = pts[last] - pts[first]
+        rel = pts[first+1:last] - pts[first]
+        seg_len = math.sqrt(seg_x**2 + seg_y**2)
+        if seg_len > 0:
+            dist = abs(seg_x*rel[:, 1] - seg_y*rel[:, 0]) / seg_len
+        else:
+            dist = np_hypot(rel[:, 0], rel[:, 1])
+            
+        farthest = dist.argmax()
+        if dist[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+            
+    return [tuple(pt) for pt in pts[keep]]
+
+
+def binned_envelope(pos, depth, bin_width):
+    """Maximum depth of points within bins of equal width along an axis.
+    
+    Parameters
+    ----------
+    pos : array_like
+      Position of points along axis, in ascending order.
+    depth : array_like
+      Depth of each point.
+    bin_width : float
+      Width of each bin.
+      
+    Returns
+    -------
+    ndarray
+      Position of vertices along axis.
+    ndarray
+      Depth of vertices.
+      
+      Each non-empty bin contributes a vertex at the position of its
+      first and last point, or a single vertex if these are the same,
+      at the maximum depth of its points.
+    """
+    
+    pos = np_asarray(pos, dtype=float)
+    depth = np_asarray(depth, dtype=float)
+    
+    bins = np_floor((pos - pos[0]) / bin_width)
+    bin_start = np_concatenate(([0], np_flatnonzero(np_diff(bins)) + 1))
+    bin_end = np_concatenate((bin_start[1:], [len(pos)])) - 1
+    
+    vertex_pos = np_column_stack((pos[bin_start], pos[bin_end])).ravel()
+    vertex_depth = np_maximum.reduceat(depth, bin_start).repeat(2)
+    
+    distinct = np_ones(len(vertex_pos), dtype=bool)
+    distinct[1::2] = (bin_start != bin_end)
+    
+    return vertex_pos[distinct], vertex_depth[distinct]
+
     
 def unit_vector(v):
     mag = length(v)
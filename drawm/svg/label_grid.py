@@ -0,0 +1,172 @@
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = 'Donovan Parks'
+__copyright__ = 'Copyright 2016'
+__credits__ = ['Donovan Parks']
+__license__ = 'GPL3'
+__version__ = '0.0.1'
+__maintainer__ = 'Donovan Parks'
+__email__ = 'donovan.parks@gmail.com'
+__status__ = 'Development'
+
+from collections import defaultdict
+from math import floor
+
+
+def _project(box, axis_x, axis_y):
+    """Interval covered by projection of box onto an axis."""
+
+    proj = [pt_x*axis_x + pt_y*axis_y for pt_x, pt_y in box]
+    return min(proj), max(proj)
+
+
+def boxes_overlap(box1, box2):
+    """Determine if two convex quadrilaterals overlap.
+
+    Uses the separating axis theorem with the edge
+    normals of both boxes as candidate axes.
+
+    Parameters
+    ----------
+    box1 : list of (float, float)
+      Corners of first box in drawing order.
+    box2 : list of (float, float)
+      Corners of second box in drawing order.
+
+    Returns
+    -------
+    bool
+      True if boxes overlap, otherwise False.
+    """
+
+    for box in (box1, box2):
+        for i in xrange(2):
+            edge_x = box[i+1][0] - box[i][0]
+            edge_y = box[i+1][1] - box[i][1]
+            min1, max1 = _project(box1, -edge_y, edge_x)
+            min2, max2 = _project(box2, -edge_y, edge_x)
+            if max1 <= min2 or max2 <= min1:
+                return False
+
+    return True
+
+
+class LabelGrid(object):
+    """Uniform grid of placed label boxes.
+
+    Each box is registered in every grid cell overlapped by its axis-aligned
+    bounding box so a new box need only be tested against the few boxes
+    sharing its cells. With cells comparable in size to a label, placing
+    n labels takes O(n) expected time.
+    """
+
+    def __init__(self, cell_size):
+        """Initialize empty grid.
+
+        Parameters
+        ----------
+        cell_size : float
+          Width and height of grid cells.
+        """
+
+        self.cell_size = float(cell_size)
+        self.boxes = []
+        self.cells = defaultdict(list)
+
+    def _cells(self, box):
+        """Grid cells overlapped by bounding box of a box."""
+
+        xs = [pt_x for pt_x, _pt_y in box]
+        ys = [pt_y for _pt_x, pt_y in box]
+        start_col = int(floor(min(xs) / self.cell_size))
+        end_col = int(floor(max(xs) / self.cell_size))
+        start_row = int(floor(min(ys) / self.cell_size))
+        end_row = int(floor(max(ys) / self.cell_size))
+
+        return [(col, row)
+                for col in xrange(start_col, end_col + 1)
+                for row in xrange(start_row, end_row + 1)]
+
+    def collides(self, box):
+        """Determine if box overlaps a placed box."""
+
+        tested = set()
+        for cell in self._cells(box):
+            for box_id in self.cells.get(cell, []):
+                if box_id in tested:
+                    continue
+                tested.add(box_id)
+
+                if boxes_overlap(box, self.boxes[box_id]):
+                    return True
+
+        return False
+
+    def insert(self, box):
+        """Place box if it does not overlap a placed box.
+
+        Parameters
+        ----------
+        box : list of (float, float)
+          Corners of box in drawing order.
+
+        Returns
+        -------
+        bool
+          True if box was placed, False if it collides with a placed box.
+        """
+
+        if self.collides(box):
+            return False
+
+        box_id = len(self.boxes)
+        self.boxes.append(box)
+        for cell in self._cells(box):
+            self.cells[cell].append(box_id)
+
+        return True
+
+
+class LabelExtents(object):
+    """Bounding box of rendered labels."""
+
+    def __init__(self):
+        """Initialize empty extents."""
+
+        self.min_x = self.min_y = float('inf')
+        self.max_x = self.max_y = float('-inf')
+
+    def is_empty(self):
+        """Determine if no labels have been added."""
+
+        return self.min_x > self.max_x
+
+    def add(self, box):
+        """Extend bounding box to include a label box.
+
+        Parameters
+        ----------
+        box : list of (float, float)
+          Corners of box in drawing order.
+        """
+
+        for pt_x, pt_y in box:
+            self.min_x = min(self.min_x, pt_x)
+            self.max_x = max(self.max_x, pt_x)
+            self.min_y = min(self.min_y, pt_y)
+            self.max_y = max(self.max_y, pt_y)
@@ -30,10 +30,8 @@ import sys
 import logging
 import math
 
-import svgwrite
-
-from drawm.svg.svg_utils import render_label
-from drawm.tree.newick_utils import parse_label
+from drawm.svg.svg_utils import label_box, render_label
+from drawm.svg.label_grid import LabelGrid
 
 
 class LabelProps:
@@ -58,6 +56,11 @@ class LabelProps:
         self.leaf_font_color = 'rgb(0,0,0)'
         self.leaf_sample_rate = 1
         
+        self.declutter = False
+        
+        # leaves with a label placed in the label grid
+        self.placed_leaves = None
+        
         if not config_file:
             return # use default values
 
@@ -90,63 +93,131 @@ class LabelProps:
                     self.leaf_font_color = values[0]
                 elif attribute == 'leaf_sample_rate':
                     self.leaf_sample_rate = int(values[0])
+                elif attribute == 'declutter':
+                    self.declutter = (values[0] == 'True')
                 else:
                     self.logger.warning('[LabelProps] Unexpected attribute: %s' % attribute)
      
+    def _labelled_leaves(self, tree):
+        """Leaves to label given the leaf sample rate."""
+        
+        ft = tree.flat
+        leaves = ft.leaves[~ft.is_collapsed[ft.leaves]]
+        return leaves[::self.leaf_sample_rate]
+        
+    def _leaf_label_pos(self, tree, leaf_id):
+        """Anchor position of label for a leaf."""
+        
+        ft = tree.flat
+        offset = 0.02*self.inch
+        return (float(ft.x[leaf_id] + offset*ft.x_dir[leaf_id]), 
+                float(ft.y[leaf_id] + offset*ft.y_dir[leaf_id]))
+                
+    def place_labels(self, tree, collapsed_labels):
+        """Create label grid and place leaf and collapsed lineage labels.
+        
+        Labels are placed in order of priority with labels
+        overlapping a previously placed label being dropped. Leaf
+        labels are placed first, followed by collapsed lineage labels 
+        and then labels of other properties as they are rendered.
+        
+        Parameters
+        ----------
+        tree : Tree
+          Tree with layout of nodes.
+        collapsed_labels : list of (int, str, float, float, float, float)
+          Collapsed lineage node, label, position of label, 
+          angle of label, and font size of label.
+        """
+        
+        if not self.declutter:
+            return
+            
+        self.logger.info('Placing labels.')
+        
+        # cells are sized to typical height of a label
+        font_sizes = [self.leaf_font_size, self.internal_font_size]
+        font_sizes += [font_size for _, _, _, _, _, font_size in collapsed_labels]
+        tree.label_grid = LabelGrid(2*max(font_sizes))
+        
+        self.placed_leaves = set()
+        if self.show_leaf_labels:
+            ft = tree.flat
+            leaves = self._labelled_leaves(tree)
+            for leaf_id in leaves:
+                x, y = self._leaf_label_pos(tree, leaf_id)
+                box = label_box(x, y, 
+                                float(ft.angle[leaf_id]), 
+                                ft.nodes[leaf_id].taxon.label, 
+                                self.leaf_font_size, 
+                                middle_y=True)
+                if tree.label_grid.insert(box):
+                    self.placed_leaves.add(leaf_id)
+                    
+            self.logger.info('Placed %d of %d leaf labels.' % (len(self.placed_leaves), len(leaves)))
+            
+        tree.placed_collapsed = set()
+        for node_id, label, x, y, angle, font_size in collapsed_labels:
+            box = label_box(x, y, angle, label, font_size, middle_y=True)
+            if tree.label_grid.insert(box):
+                tree.placed_collapsed.add(node_id)
+                
+        if collapsed_labels:
+            self.logger.info('Placed %d of %d collapsed lineage labels.' % (len(tree.placed_collapsed), len(collapsed_labels)))
+     
     def _render_internal_labels(self, tree):
         """Render internal labels."""
     
-        label_group = svgwrite.container.Group(id='internal_node_labels')
+        label_group = self.dwg.g(id='internal_node_labels')
         self.dwg.add(label_group)
         
+        ft = tree.flat
         node_count = -1
-        for node in tree.preorder_node_iter(lambda n: not n.is_leaf()):
-            if node.is_collapsed:
+        for node_id in xrange(ft.num_nodes):
+            if ft.is_leaf[node_id] or ft.is_collapsed[node_id]:
                 continue
                 
             node_count += 1
             if node_count % self.internal_sample_rate:
                 continue
                 
-            _support, taxon, _auxiliary_info = parse_label(node.label)
+            taxon = ft.taxon[node_id]
             offset = 0.02*self.inch
             render_label(self.dwg,
-                            node.x + offset*node.x_dir, 
-                            node.y + offset*node.y_dir, 
-                            node.angle, 
+                            float(ft.x[node_id] + offset*ft.x_dir[node_id]), 
+                            float(ft.y[node_id] + offset*ft.y_dir[node_id]), 
+                            float(ft.angle[node_id]), 
                             taxon, 
                             self.internal_font_size, 
                             self.internal_font_color,
                             middle_y=True,
                             group=label_group,
-                            id_prefix='internal_label')
+                            id_prefix='internal_label',
+                            grid=tree.label_grid)
 
     def _render_leaf_labels(self, tree):
         """"Render labels for extant taxa."""
         
-        label_group = svgwrite.container.Group(id='leaf_node_labels')
+        label_group = self.dwg.g(id='leaf_node_labels')
         self.dwg.add(label_group)
         
-        node_count = -1
-        for leaf in tree.leaf_node_iter():
-            if leaf.is_collapsed:
-                continue
-
-            node_count += 1
-            if node_count % self.leaf_sample_rate:
+        ft = tree.flat
+        for leaf_id in self._labelled_leaves(tree):
+            if tree.label_grid is not None and leaf_id not in self.placed_leaves:
                 continue
             
-            offset = 0.02*self.inch
+            x, y = self._leaf_label_pos(tree, leaf_id)
             render_label(self.dwg, 
-                            leaf.x + offset*leaf.x_dir, 
-                            leaf.y + offset*leaf.y_dir, 
-                            leaf.angle, 
-                            leaf.taxon.label, 
+                            x, 
+                            y, 
+                            float(ft.angle[leaf_id]), 
+                            ft.nodes[leaf_id].taxon.label, 
                             self.leaf_font_size, 
                             self.leaf_font_color,
                             middle_y=True,
                             group=label_group,
-                            id_prefix='leaf_label')
+                            id_prefix='leaf_label',
+                            extents=tree.label_extents)
                     
     def render(self, tree):
         """Render labels."""
@@ -28,14 +28,23 @@ import os
 import sys
 import logging
 import math
-from collections import defaultdict
 
-import svgwrite
+from numpy import (empty as np_empty,
+                    arange as np_arange,
+                    lexsort as np_lexsort,
+                    radians as np_radians,
+                    unwrap as np_unwrap,
+                    cos as np_cos,
+                    sin as np_sin)
 
-from drawm.svg.geometry import unit_vector
-from drawm.svg.svg_utils import render_label
-from drawm.tree.newick_utils import parse_label
-from drawm.tree.tree_utils import find_node
+from drawm.svg.geometry import (unit_vector, 
+                                    simplify_polyline, 
+                                    binned_envelope)
+from drawm.svg.svg_utils import (render_label,
+                                    format_path_data,
+                                    arc_subpath,
+                                    round_coords)
+from drawm.tree.tree_utils import find_nodes
 
 
 class LineageProps:
@@ -52,6 +61,7 @@ class LineageProps:
         self.show_lineages = False
         self.display_method = None
         self.display_depth = 'MAX'
+        self.path_tolerance = 0
         self.font_size = None
         self.font_color = None
         self.lineage_map = {}
@@ -76,12 +86,14 @@ class LineageProps:
                     self.show_lineages = (values[0] == 'True')
                 elif attribute == 'display_method':
                     display_method = values[0]
-                    assert(display_method in ['OUTLINE_LINEAGE', 'ARC_LABELS'])
+                    assert(display_method in ['OUTLINE_LINEAGE', 'OUTLINE_ENVELOPE', 'ARC_LABELS'])
                     self.display_method = values[0]
                 elif attribute == 'display_depth':
                     display_depth = values[0]
                     assert(display_depth in ['TIGHT', 'MAX'])
                     self.display_depth = values[0]    
+                elif attribute == 'path_tolerance':
+                    self.path_tolerance = float(values[0])
                 elif attribute == 'font_size':
                     self.font_size = float(values[0]) * (self.inch/90.0)
                 elif attribute == 'font_color':
@@ -102,13 +114,13 @@ class LineageProps:
             
         self._lineage_nodes(tree)
         
-        lineage_group = svgwrite.container.Group(id='lineage')
+        lineage_group = self.dwg.g(id='lineage')
         self.dwg.add(lineage_group)
         
-        lineage_text_group = svgwrite.container.Group(id='lineage_text')
+        lineage_text_group = self.dwg.g(id='lineage_text')
         self.dwg.add(lineage_text_group)
         
-        if self.display_method == 'OUTLINE_LINEAGE':
+        if self.display_method in ['OUTLINE_LINEAGE', 'OUTLINE_ENVELOPE']:
             self._render_outlines(tree, lineage_group, lineage_text_group)
         elif self.display_method == 'ARC_LABELS':
             self._render_arc_labels(tree, lineage_group, lineage_text_group)
@@ -116,19 +128,21 @@ class LineageProps:
     def _lineage_nodes(self, tree):
         """Identify nodes in tree associated with lineages to render."""
         
+        lineage_names = list(self.lineage_map)
+        node_ids = find_nodes(tree, lineage_names)
+        
         new_lineage_map = {}
-        for lineage_name, data in self.lineage_map.iteritems():
-            node = find_node(tree, lineage_name)
-
-            if node:
-                new_lineage_map[node] = data
+        for lineage_name, node_id in zip(lineage_names, node_ids):
+            if node_id != -1:
+                new_lineage_map[node_id] = self.lineage_map[lineage_name]
             else:
                 self.logger.warning('Failed to identify node with label: %s.' % lineage_name)
             
         self.lineage_map = new_lineage_map
             
     def _outline_circular(self, 
-                            node, 
+                            tree,
+                            node_id, 
                             taxon, 
                             color, 
                             alpha, 
@@ -137,68 +151,70 @@ class LineageProps:
                             lineage_text_group):
         """Outline lineage in circular tree."""
         
+        ft = tree.flat
+        precision = self.dwg.coordinate_precision
+        
         path = self.dwg.path(id='lineage_%s' % taxon.replace(' ', '_'))
         path.fill(color=color, opacity=alpha)
         path.stroke(color=color, width=stroke_width)
 
         # start at current node
-        path.push("M%f,%f" % (node.x, node.y))
+        path.push(*format_path_data("M%f,%f", [(ft.x[node_id], ft.y[node_id])], precision))
         
         # descend 'right' of lineage
-        right_branch = node.child_node_iter().next()
+        right_branch = ft.first_child[node_id]
         while True:
             # draw arc
+            parent_id = ft.parent[right_branch]
             angle_dir = '+'
-            if (right_branch.parent_node.angle - right_branch.angle) % 360 <= 180:
+            if (ft.angle[parent_id] - ft.angle[right_branch]) % 360 <= 180:
                 # child node is further clockwise than parent so must
                 # draw angle counter-clockwise (i.e., negative) direction
                 angle_dir = '-'
                 
-            path.push_arc(target=(right_branch.corner_x, right_branch.corner_y), 
-                        rotation=0, 
-                        r=right_branch.parent_node.rel_depth,
-                        large_arc=False,
-                        angle_dir=angle_dir,
-                        absolute=True)
+            path.push(arc_subpath(ft.corner_x[right_branch], 
+                                    ft.corner_y[right_branch], 
+                                    ft.rel_depth[parent_id],
+                                    angle_dir=angle_dir,
+                                    precision=precision))
             
-            if right_branch.is_leaf():
+            if ft.is_leaf[right_branch]:
                 break
              
-            path.push("L%f,%f" % (right_branch.x, right_branch.y))
-            right_branch = right_branch.child_node_iter().next()
+            path.push(*format_path_data("L%f,%f", [(ft.x[right_branch], ft.y[right_branch])], precision))
+            right_branch = ft.first_child[right_branch]
 
         # move across children    
-        last_leaf = None
-        for leaf in node.leaf_iter():
-            path.push("L%f,%f" % (leaf.x, leaf.y))
-            last_leaf = leaf
+        leaves = ft.leaf_indices(node_id)
+        leaf_pts = simplify_polyline(zip(ft.x[leaves], ft.y[leaves]), self.path_tolerance)
+        path.push(*format_path_data("L%f,%f", leaf_pts, precision))
         
         # ascend 'left' of lineage
-        left_branch = last_leaf
-        while left_branch != node:
-            path.push("L%f,%f" % (left_branch.corner_x, left_branch.corner_y))
+        left_branch = leaves[-1]
+        while left_branch != node_id:
+            path.push(*format_path_data("L%f,%f", [(ft.corner_x[left_branch], ft.corner_y[left_branch])], precision))
             
             # draw arc
+            parent_id = ft.parent[left_branch]
             angle_dir = '+'
-            if (left_branch.angle - left_branch.parent_node.angle) % 360 <= 180:
+            if (ft.angle[left_branch] - ft.angle[parent_id]) % 360 <= 180:
                 # child node is further clockwise than parent so must
                 # draw angle counter-clockwise (i.e., negative) direction
                 angle_dir = '-'
                 
-            path.push_arc(target=(left_branch.parent_node.x, left_branch.parent_node.y), 
-                            rotation=0, 
-                            r=left_branch.parent_node.rel_depth,
-                            large_arc=False,
-                            angle_dir=angle_dir,
-                            absolute=True)
+            path.push(arc_subpath(ft.x[parent_id], 
+                                    ft.y[parent_id], 
+                                    ft.rel_depth[parent_id],
+                                    angle_dir=angle_dir,
+                                    precision=precision))
 
-            left_branch = left_branch.parent_node
+            left_branch = parent_id
 
         lineage_group.add(path)
                 
     def _outline_rectangular(self,
                                 tree,
-                                node, 
+                                node_id, 
                                 taxon, 
                                 color, 
                                 alpha, 
@@ -208,25 +224,27 @@ class LineageProps:
         """Outline lineage in circular tree."""
         
         # get top and bottom leaf nodes
-        leaves = [leaf for leaf in node.postorder_iter(lambda n: n.is_leaf())]
+        ft = tree.flat
+        leaves = ft.leaf_indices(node_id)
         start_leaf = leaves[0]
         end_leaf = leaves[-1]
 
         # determine start and end of rectangle covering lineage
-        start_x = node.x
+        start_x = float(ft.x[node_id])
         end_x = 0
         if self.display_depth == 'MAX':
             end_x = tree.width + tree.start_x
         elif self.display_depth == 'TIGHT':
-            for leaf in node.leaf_iter():
-                if leaf.x > end_x:
-                    end_x = leaf.x
+            end_x = max(end_x, float(ft.x[leaves].max()))
                 
-        start_y = start_leaf.y
-        end_y = end_leaf.y
+        start_y = float(ft.y[start_leaf])
+        end_y = float(ft.y[end_leaf])
         
-        rect = self.dwg.rect(insert=(start_x, start_y),
-                                size=(abs(end_x-start_x), abs(end_y-start_y)),
+        insert, size = round_coords([(start_x, start_y), 
+                                        (abs(end_x-start_x), abs(end_y-start_y))], 
+                                        self.dwg.coordinate_precision)
+        rect = self.dwg.rect(insert=insert,
+                                size=size,
                                 id='lineage_%s' % taxon.replace(' ', '_'))
         rect.fill(color=color, opacity=alpha)
         rect.stroke(color=color, width=stroke_width)
@@ -246,144 +264,307 @@ class LineageProps:
                         self.font_color,
                         middle_y=True,
                         group=lineage_text_group,
-                        id_prefix='lineage_text')
+                        id_prefix='lineage_text',
+                        grid=tree.label_grid,
+                        extents=tree.label_extents)
+            
+    def _envelope_circular(self, 
+                            tree,
+                            node_id, 
+                            taxon, 
+                            color, 
+                            alpha, 
+                            stroke_width, 
+                            lineage_group, 
+                            lineage_text_group):
+        """Outline envelope of lineage in circular tree.
+        
+        The outline follows the deepest leaf within each pixel 
+        along the outer edge of the lineage, so the number of 
+        vertices is bounded by the resolution of the image.
+        """
+        
+        ft = tree.flat
+        precision = self.dwg.coordinate_precision
+        leaves = ft.leaf_indices(node_id)
+        leaf_angles = np_unwrap(np_radians(ft.angle[leaves]))
+        leaf_depths = ft.rel_depth[leaves]
+        
+        # bin leaves by arc length along outer edge of lineage
+        max_depth = leaf_depths.max()
+        arc_pos, depths = binned_envelope(leaf_angles * max_depth, leaf_depths, 1.0)
+        
+        angles = arc_pos / max_depth
+        envelope_x = depths * np_cos(angles) + tree.start_x
+        envelope_y = depths * np_sin(angles) + tree.start_y
+        
+        path = self.dwg.path(id='lineage_%s' % taxon.replace(' ', '_'))
+        path.fill(color=color, opacity=alpha)
+        path.stroke(color=color, width=stroke_width)
+        
+        # start at current node and move to angle of first leaf
+        rel_depth = float(ft.rel_depth[node_id])
+        path.push(*format_path_data("M%f,%f", [(ft.x[node_id], ft.y[node_id])], precision))
+        
+        start_angle = float(angles[0])
+        angle_dir = '+'
+        if (ft.angle[node_id] - ft.angle[leaves[0]]) % 360 <= 180:
+            angle_dir = '-'
+        path.push(arc_subpath(rel_depth * math.cos(start_angle) + tree.start_x, 
+                                rel_depth * math.sin(start_angle) + tree.start_y, 
+                                rel_depth,
+                                angle_dir=angle_dir,
+                                precision=precision))
+        
+        # follow envelope of leaves
+        path.push(*format_path_data("L%f,%f", zip(envelope_x, envelope_y), precision))
             
+        # return to current node from angle of last leaf
+        end_angle = float(angles[-1])
+        path.push(*format_path_data("L%f,%f", [(rel_depth * math.cos(end_angle) + tree.start_x, 
+                                                rel_depth * math.sin(end_angle) + tree.start_y)], 
+                                    precision))
+        
+        angle_dir = '+'
+        if (ft.angle[leaves[-1]] - ft.angle[node_id]) % 360 <= 180:
+            angle_dir = '-'
+        path.push(arc_subpath(ft.x[node_id], 
+                                ft.y[node_id], 
+                                rel_depth,
+                                angle_dir=angle_dir,
+                                precision=precision))
+
+        lineage_group.add(path)
+        
+    def _envelope_rectangular(self,
+                                tree,
+                                node_id, 
+                                taxon, 
+                                color, 
+                                alpha, 
+                                stroke_width, 
+                                lineage_group, 
+                                lineage_text_group):
+        """Outline envelope of lineage in rectangular tree.
+        
+        The outline follows the deepest leaf within each pixel
+        row spanned by the lineage, so the number of vertices is 
+        bounded by the resolution of the image.
+        """
+        
+        ft = tree.flat
+        precision = self.dwg.coordinate_precision
+        leaves = ft.leaf_indices(node_id)
+        envelope_y, envelope_x = binned_envelope(ft.y[leaves], ft.x[leaves], 1.0)
+        
+        start_x = ft.x[node_id]
+        path = self.dwg.path(format_path_data("M%f,%f", [(start_x, envelope_y[0])], precision)[0], 
+                                id='lineage_%s' % taxon.replace(' ', '_'))
+        path.fill(color=color, opacity=alpha)
+        path.stroke(color=color, width=stroke_width)
+        
+        path.push(*format_path_data("L%f,%f", zip(envelope_x, envelope_y), precision))
+        path.push(*format_path_data("L%f,%f", [(start_x, envelope_y[-1])], precision))
+        path.push("Z")
+        
+        lineage_group.add(path)
+        
+        # render label
+        label_x = float(envelope_x.max()) + 0.05*self.inch
+        label_y = float(0.5*(envelope_y[0] + envelope_y[-1]))
+
+        render_label(self.dwg, 
+                        label_x, 
+                        label_y, 
+                        0, 
+                        taxon, 
+                        self.font_size, 
+                        self.font_color,
+                        middle_y=True,
+                        group=lineage_text_group,
+                        id_prefix='lineage_text',
+                        grid=tree.label_grid,
+                        extents=tree.label_extents)
+        
     def _render_outlines(self, tree, lineage_group, lineage_text_group):
         """Color named lineages."""
+        
+        if self.display_method == 'OUTLINE_ENVELOPE':
+            outline_circular = self._envelope_circular
+            outline_rectangular = self._envelope_rectangular
+        else:
+            outline_circular = self._outline_circular
+            outline_rectangular = self._outline_rectangular
+            
+        # lineages are outlined in preorder
+        ft = tree.flat
+        for node_id in sorted(self.lineage_map):
+            if ft.is_leaf[node_id]:
+                continue
                 
-        for node in tree.preorder_node_iter(lambda n: not n.is_leaf()):
-            support, taxon, auxiliary_info = parse_label(node.label)
-            if node in self.lineage_map:
-                # make sure lineage isn't collapsed
-                if node.is_collapsed or node.is_collapsed_root:
-                    continue
-                    
-                lineage_name, lineage_label, color, alpha, stroke_width = self.lineage_map[node]
+            # make sure lineage isn't collapsed
+            if ft.collapse_root[node_id] != -1:
+                continue
                 
-                if tree.display_method == 'CIRCULAR':
-                    self._outline_circular(node, 
-                                            lineage_label, 
-                                            color, 
-                                            alpha, 
-                                            stroke_width, 
-                                            lineage_group, 
-                                            lineage_text_group)
-                elif tree.display_method == 'RECTANGULAR':
-                    self._outline_rectangular(tree,
-                                                node, 
-                                                lineage_label, 
-                                                color, 
-                                                alpha, 
-                                                stroke_width, 
-                                                lineage_group, 
-                                                lineage_text_group)
+            lineage_name, lineage_label, color, alpha, stroke_width = self.lineage_map[node_id]
+            
+            if tree.display_method == 'CIRCULAR':
+                outline_circular(tree,
+                                    node_id, 
+                                    lineage_label, 
+                                    color, 
+                                    alpha, 
+                                    stroke_width, 
+                                    lineage_group, 
+                                    lineage_text_group)
+            elif tree.display_method == 'RECTANGULAR':
+                outline_rectangular(tree,
+                                    node_id, 
+                                    lineage_label, 
+                                    color, 
+                                    alpha, 
+                                    stroke_width, 
+                                    lineage_group, 
+                                    lineage_text_group)
+                
+    def _pack_arcs(self, arc_start, arc_end):
+        """Pack arcs into concentric rings.
+        
+        Arcs are placed in the innermost ring outside of all arcs 
+        whose interval they enclose. Intervals are swept in order 
+        of their start, with enclosing intervals first, while a stack
+        tracks the intervals enclosing the current interval.
+        
+        Parameters
+        ----------
+        arc_start : ndarray
+          Start of interval spanned by each arc.
+        arc_end : ndarray
+          End of interval spanned by each arc (exclusive).
+          
+        Returns
+        -------
+        list
+          Ring of each arc, starting at 1.
+        """
+        
+        order = np_lexsort((-arc_end, arc_start))
+        
+        enclosing = [-1] * len(order)
+        stack = []
+        for arc in order:
+            while stack and arc_end[stack[-1]] <= arc_start[arc]:
+                stack.pop()
+                
+            if stack:
+                enclosing[arc] = stack[-1]
+            stack.append(arc)
+            
+        # enclosed arcs follow enclosing arcs in the sweep,
+        # so rings are set by walking the sweep backwards
+        rings = [1] * len(order)
+        for arc in order[::-1]:
+            e = enclosing[arc]
+            if e != -1 and rings[arc] + 1 > rings[e]:
+                rings[e] = rings[arc] + 1
                 
+        return rings
+        
     def _render_arc_labels(self, tree, lineage_group, lineage_text_group):
         """Color named lineages."""
 
-        rel_depth = 1.00
-        label_depth = defaultdict(int)
+        ft = tree.flat
+        
+        # arcs are drawn for lineages which aren't collapsed, 
+        # in postorder so nested arcs are drawn first
+        node_ids = [node_id for node_id in self.lineage_map 
+                        if not ft.is_leaf[node_id] and ft.collapse_root[node_id] == -1]
+        post_rank = np_empty(ft.num_nodes, dtype=int)
+        post_rank[ft.postorder] = np_arange(ft.num_nodes)
+        node_ids.sort(key=lambda node_id: post_rank[node_id])
+        
+        # arcs span the leaves of each lineage
+        leaf_start = ft.leaf_start[node_ids]
+        leaf_end = leaf_start + ft.num_leaves[node_ids]
+        rings = self._pack_arcs(leaf_start, leaf_end)
+        
         labels = []
-        for node in tree.postorder_node_iter():
-            support, taxon, auxiliary_info = parse_label(node.label)
-            
-            if node.is_leaf():
-                label_depth[node.id] = 0
-                continue
+        for node_id, ring in zip(node_ids, rings):
+            lineage_name, lineage_label, color, alpha, stroke_width = self.lineage_map[node_id]
             
-            max_child_label_depth = 0
-            for c in node.child_node_iter():
-                if label_depth[c.id] > max_child_label_depth:
-                    max_child_label_depth = label_depth[c.id]
+            start_leaf = ft.first_leaf(node_id)
+            end_leaf = ft.last_leaf(node_id)
+            deepest_leaf = ft.deepest_leaf[node_id]
             
-            if node not in self.lineage_map:
-                label_depth[node.id] = max_child_label_depth
-            else:
-                # make sure lineage isn't collapsed
-                if node.is_collapsed or node.is_collapsed_root:
-                    continue
-                    
-                # find deepest leaf node in lineage
-                deepest_rel_depth = 0
-                deepest_x = 0
-                for leaf in node.leaf_iter():
-                    if leaf.rel_depth > deepest_rel_depth:
-                        deepest_rel_depth = leaf.rel_depth
-                        deepest_x = leaf.x
-                
-                # draw arc
-                lineage_name, lineage_label, color, alpha, stroke_width = self.lineage_map[node]
-    
-                label_depth[node.id] = max_child_label_depth+1
-                
-                leaves = [leaf for leaf in node.postorder_iter(lambda n: n.is_leaf())]
-                start_leaf = leaves[0]
-                end_leaf = leaves[-1]
+            if tree.display_method == 'CIRCULAR':
+                # draw arc to parent
+                angle_dir = '+'
+                large_arc = False
+                if (ft.angle[start_leaf] - ft.angle[end_leaf]) % 360 <= 180:
+                    # start leaf is further clockwise than end leaf so must
+                    # draw angle counter-clockwise (i.e., negative) direction
+                    #angle_dir = '-'
+                    large_arc=True
+ 
+                if self.display_depth == 'MAX':
+                    depth = tree.height
+                elif self.display_depth == 'TIGHT':
+                    depth = float(ft.rel_depth[deepest_leaf])
                 
-                if tree.display_method == 'CIRCULAR':
-                    # draw arc to parent
-                    angle_dir = '+'
-                    large_arc = False
-                    if (start_leaf.angle - end_leaf.angle) % 360 <= 180:
-                        # start leaf is further clockwise than end leaf so must
-                        # draw angle counter-clockwise (i.e., negative) direction
-                        #angle_dir = '-'
-                        large_arc=True
-     
-                    if self.display_depth == 'MAX':
-                        depth = tree.height
-                    elif self.display_depth == 'TIGHT':
-                        depth = deepest_rel_depth
-                    
-                    depth += 0.05*self.inch*label_depth[node.id]
+                depth += 0.05*self.inch*ring
 
-                    start_x = depth * start_leaf.x_dir + 0.5*self.dwg.canvas_width
-                    start_y = depth * start_leaf.y_dir + 0.5*self.dwg.canvas_height
+                start_x = depth * float(ft.x_dir[start_leaf]) + 0.5*self.dwg.canvas_width
+                start_y = depth * float(ft.y_dir[start_leaf]) + 0.5*self.dwg.canvas_height
 
-                    end_x = depth * end_leaf.x_dir + 0.5*self.dwg.canvas_width
-                    end_y = depth * end_leaf.y_dir + 0.5*self.dwg.canvas_height
+                end_x = depth * float(ft.x_dir[end_leaf]) + 0.5*self.dwg.canvas_width
+                end_y = depth * float(ft.y_dir[end_leaf]) + 0.5*self.dwg.canvas_height
  
-                    p = self.dwg.path('M%f,%f' % (start_x, start_y), 
-                                        id='lineage_%s' % lineage_label.replace(' ', '_'))
-                    p.push_arc(target=(end_x, end_y), 
-                                rotation=0, 
-                                r=depth,
-                                large_arc=large_arc,
-                                angle_dir=angle_dir,
-                                absolute=True)
+                precision = self.dwg.coordinate_precision
+                p = self.dwg.path(format_path_data('M%f,%f', [(start_x, start_y)], precision)[0], 
+                                    id='lineage_%s' % lineage_label.replace(' ', '_'))
+                p.push(arc_subpath(end_x, 
+                                    end_y, 
+                                    depth,
+                                    large_arc=large_arc,
+                                    angle_dir=angle_dir,
+                                    precision=precision))
    
-                    x = 0.5 * (start_leaf.x_dir + end_leaf.x_dir)
-                    y = 0.5 * (start_leaf.y_dir + end_leaf.y_dir)
-                    x_dir, y_dir = unit_vector((x,y))
-                    if large_arc:
-                        y_dir *= -1
-                        x_dir *= -1
-                    
-                    label_x = (depth + 0.5*stroke_width + 0.02*self.inch) * x_dir + 0.5*self.dwg.canvas_width
-                    label_y = (depth + 0.5*stroke_width + 0.02*self.inch) * y_dir + 0.5*self.dwg.canvas_height
-                    label_angle = math.degrees(math.atan2(y_dir, x_dir))
-                elif tree.display_method == 'RECTANGULAR':
-                    if self.display_depth == 'MAX':
-                        depth = tree.width + tree.start_x
-                    elif self.display_depth == 'TIGHT':
-                        depth = deepest_x
-                    
-                    depth += 0.05*self.inch*label_depth[node.id]
-                    
-                    p = self.dwg.line(start=(depth, start_leaf.y), 
-                                        end=(depth, end_leaf.y),
-                                        id='lineage_%s' % lineage_label.replace(' ', '_'))
-                                        
-                    label_x = depth + 0.5*stroke_width
-                    label_y = 0.5*(start_leaf.y + end_leaf.y)
-                    label_angle = 0
-                    
-                p.fill(color='none')
-                p.stroke(color=color, opacity=alpha, width=stroke_width)
-                lineage_group.add(p)
+                x = 0.5 * float(ft.x_dir[start_leaf] + ft.x_dir[end_leaf])
+                y = 0.5 * float(ft.y_dir[start_leaf] + ft.y_dir[end_leaf])
+                x_dir, y_dir = unit_vector((x,y))
+                if large_arc:
+                    y_dir *= -1
+                    x_dir *= -1
                 
-                labels.append((lineage_label, label_x, label_y, label_angle))
+                label_x = (depth + 0.5*stroke_width + 0.02*self.inch) * x_dir + 0.5*self.dwg.canvas_width
+                label_y = (depth + 0.5*stroke_width + 0.02*self.inch) * y_dir + 0.5*self.dwg.canvas_height
+                label_angle = math.degrees(math.atan2(y_dir, x_dir))
+            elif tree.display_method == 'RECTANGULAR':
+                if self.display_depth == 'MAX':
+                    depth = tree.width + tree.start_x
+                elif self.display_depth == 'TIGHT':
+                    depth = float(ft.x[deepest_leaf])
+                
+                depth += 0.05*self.inch*ring
+                
+                start, end = round_coords([(depth, ft.y[start_leaf]), 
+                                            (depth, ft.y[end_leaf])], 
+                                            self.dwg.coordinate_precision)
+                p = self.dwg.line(start=start, 
+                                    end=end,
+                                    id='lineage_%s' % lineage_label.replace(' ', '_'))
+                                    
+                label_x = depth + 0.5*stroke_width
+                label_y = 0.5*float(ft.y[start_leaf] + ft.y[end_leaf])
+                label_angle = 0
+                
+            p.fill(color='none')
+            p.stroke(color=color, opacity=alpha, width=stroke_width)
+            lineage_group.add(p)
             
+            labels.append((lineage_label, label_x, label_y, label_angle))
+        
+
         # render arc labels after arcs to ensure text is on top
         for lineage_label, label_x, label_y, label_angle in labels:
             render_label(self.dwg, 
@@ -395,5 +576,7 @@ class LineageProps:
                             self.font_color,
                             middle_y=True,
                             group=lineage_text_group,
-                            id_prefix='lineage_text')
+                            id_prefix='lineage_text',
+                            grid=tree.label_grid,
+                            extents=tree.label_extents)
        
\ No newline at end of file
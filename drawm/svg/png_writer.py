@@ -0,0 +1,590 @@
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = 'Donovan Parks'
+__copyright__ = 'Copyright 2016'
+__credits__ = ['Donovan Parks']
+__license__ = 'GPL3'
+__version__ = '0.0.1'
+__maintainer__ = 'Donovan Parks'
+__email__ = 'donovan.parks@gmail.com'
+__status__ = 'Development'
+
+import re
+import math
+import time
+
+try:
+    from PIL import Image, ImageChops, ImageColor, ImageDraw, ImageFont
+except ImportError:
+    Image = None
+
+from drawm.svg.font_metrics import PT_TO_USER_UNITS
+
+PNG_BACKENDS = ['pillow', 'inkscape', 'none']
+
+# TrueType font used for text, found in the system font directories
+FONT_FILE = 'DejaVuSans.ttf'
+
+# maximum length in pixels of line segments approximating arcs
+ARC_SEGMENT_LENGTH = 2.0
+
+# errors raised for drawings that cannot be rasterized, such as
+# unknown colors or images too large to hold in memory
+RASTER_ERRORS = (ValueError, IOError, MemoryError)
+
+# number of arguments of path commands
+PATH_ARGS = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'A': 7}
+
+NUMBER_RE = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+PATH_TOKEN_RE = re.compile(r'[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+ROTATE_RE = re.compile(r'rotate\(([^)]*)\)')
+
+
+def pillow_available():
+    """Determine if Pillow is installed."""
+
+    return Image is not None
+
+
+def _numbers(value):
+    """Numbers in attribute value given as a number, string, or list."""
+
+    if value is None:
+        return []
+
+    if isinstance(value, basestring):
+        return [float(v) for v in NUMBER_RE.findall(value)]
+
+    if isinstance(value, (list, tuple)):
+        numbers = []
+        for v in value:
+            numbers.extend(_numbers(v))
+        return numbers
+
+    return [float(value)]
+
+
+def _length(value, reference, default=0.0):
+    """Length in pixels, with percentages relative to reference length."""
+
+    if isinstance(value, basestring) and value.endswith('%'):
+        return float(value[:-1]) * reference / 100.0
+
+    numbers = _numbers(value)
+    if not numbers:
+        return default
+
+    return numbers[0]
+
+
+def _path_data(commands):
+    """Path data of svgwrite path commands."""
+
+    data = []
+    for command in commands:
+        if isinstance(command, (list, tuple)):
+            data.append(_path_data(command))
+        else:
+            data.append('%s' % command)
+
+    return ' '.join(data)
+
+
+def _arc_points(x1, y1, rx, ry, rotation, large_arc, sweep, x2, y2):
+    """Points approximating elliptical arc from (x1, y1) to (x2, y2).
+
+    The arc is converted from the endpoint to the center parameterization
+    used by SVG and divided into segments of at most ARC_SEGMENT_LENGTH.
+    The start point is not included.
+    """
+
+    if (x1, y1) == (x2, y2):
+        return []
+
+    rx = abs(rx)
+    ry = abs(ry)
+    if rx == 0 or ry == 0:
+        return [(x2, y2)]
+
+    cos_phi = math.cos(math.radians(rotation))
+    sin_phi = math.sin(math.radians(rotation))
+
+    dx = 0.5*(x1 - x2)
+    dy = 0.5*(y1 - y2)
+    x1p = cos_phi*dx + sin_phi*dy
+    y1p = -sin_phi*dx + cos_phi*dy
+
+    # scale up radii if they are too small to span the endpoints
+    scale = (x1p*x1p)/(rx*rx) + (y1p*y1p)/(ry*ry)
+    if scale > 1:
+        rx *= math.sqrt(scale)
+        ry *= math.sqrt(scale)
+
+    num = rx*rx*ry*ry - rx*rx*y1p*y1p - ry*ry*x1p*x1p
+    den = rx*rx*y1p*y1p + ry*ry*x1p*x1p
+    coef = math.sqrt(max(num, 0) / den)
+    if bool(large_arc) == bool(sweep):
+        coef = -coef
+
+    cxp = coef*rx*y1p/ry
+    cyp = -coef*ry*x1p/rx
+    cx = cos_phi*cxp - sin_phi*cyp + 0.5*(x1 + x2)
+    cy = sin_phi*cxp + cos_phi*cyp + 0.5*(y1 + y2)
+
+    start_angle = math.atan2((y1p - cyp)/ry, (x1p - cxp)/rx)
+    end_angle = math.atan2((-y1p - cyp)/ry, (-x1p - cxp)/rx)
+    delta = end_angle - start_angle
+    if sweep and delta < 0:
+        delta += 2*math.pi
+    elif not sweep and delta > 0:
+        delta -= 2*math.pi
+
+    num_segments = max(1, int(math.ceil(abs(delta)*max(rx, ry)/ARC_SEGMENT_LENGTH)))
+    points = []
+    for i in xrange(1, num_segments):
+        t = start_angle + delta*i/num_segments
+        points.append((cx + rx*math.cos(t)*cos_phi - ry*math.sin(t)*sin_phi,
+                        cy + rx*math.cos(t)*sin_phi + ry*math.sin(t)*cos_phi))
+    points.append((x2, y2))
+
+    return points
+
+
+def path_subpaths(d):
+    """Subpaths of path data as points along with whether they are closed.
+
+    Supports the move, line, horizontal, vertical, elliptical arc,
+    and close path commands in absolute or relative form.
+
+    Parameters
+    ----------
+    d : str
+      Path data.
+
+    Returns
+    -------
+    list of (list of (float, float), bool)
+      Points of each subpath and whether it is closed.
+    """
+
+    tokens = PATH_TOKEN_RE.findall(d)
+
+    subpaths = []
+    points = []
+    x = y = start_x = start_y = 0.0
+    pos = 0
+    while pos < len(tokens):
+        command = tokens[pos]
+        pos += 1
+        if command in 'Zz':
+            if points:
+                subpaths.append((points, True))
+                points = []
+            x, y = start_x, start_y
+            continue
+
+        num_args = PATH_ARGS[command.upper()]
+        while pos + num_args <= len(tokens) and not tokens[pos].isalpha():
+            args = [float(v) for v in tokens[pos:pos + num_args]]
+            pos += num_args
+
+            relative = command.islower()
+            if command in 'Mm':
+                if points:
+                    subpaths.append((points, False))
+                if relative:
+                    x, y = x + args[0], y + args[1]
+                else:
+                    x, y = args
+                start_x, start_y = x, y
+                points = [(x, y)]
+
+                # subsequent coordinate pairs are lines
+                command = {True: 'l', False: 'L'}[relative]
+                continue
+
+            if not points:
+                points = [(x, y)]
+
+            if command in 'Ll':
+                if relative:
+                    x, y = x + args[0], y + args[1]
+                else:
+                    x, y = args
+                points.append((x, y))
+            elif command in 'Hh':
+                x = x + args[0] if relative else args[0]
+                points.append((x, y))
+            elif command in 'Vv':
+                y = y + args[0] if relative else args[0]
+                points.append((x, y))
+            else:
+                rx, ry, rotation, large_arc, sweep, target_x, target_y = args
+                if relative:
+                    target_x += x
+                    target_y += y
+                points.extend(_arc_points(x, y, rx, ry, rotation, large_arc, sweep, target_x, target_y))
+                x, y = target_x, target_y
+
+    if points:
+        subpaths.append((points, False))
+
+    return subpaths
+
+
+class PngWriter(object):
+    """PNG image rasterized in-process from the elements of a drawing.
+
+    Elements are converted to shapes (polygons, polylines, ellipses,
+    and text) when added to the drawing and the shapes painted with
+    Pillow as the markup of the elements is written, so the image
+    is built in document order without writing and parsing the SVG
+    file. One user unit of the drawing is one pixel of the image.
+    Time spent rasterizing is accumulated in elapsed.
+    """
+
+    def __init__(self, filename, size, dpi):
+        """Create blank image.
+
+        Parameters
+        ----------
+        filename : str
+          Output PNG file.
+        size : (float, float)
+          Width and height of drawing.
+        dpi : int
+          Resolution of image (dots per inch).
+        """
+
+        self.filename = filename
+        self.dpi = dpi
+        self.width = int(math.ceil(size[0]))
+        self.height = int(math.ceil(size[1]))
+
+        self.image = Image.new('RGB', (self.width, self.height), (255, 255, 255))
+        self.draw = ImageDraw.Draw(self.image, 'RGBA')
+
+        self.colors = {}
+        self.fonts = {}
+        self.glyphs = {}
+
+        self.elapsed = 0.0
+        self.error = None
+
+    def _color(self, color, opacity=None):
+        """RGBA color, or None if color is undefined."""
+
+        if color is None or color == 'none':
+            return None
+
+        key = (color, opacity)
+        rgba = self.colors.get(key)
+        if rgba is None:
+            alpha = 255
+            if opacity is not None:
+                alpha = int(round(255*min(max(float(opacity), 0.0), 1.0)))
+            rgba = ImageColor.getrgb(color)[0:3] + (alpha,)
+            self.colors[key] = rgba
+
+        return rgba
+
+    def _font(self, size):
+        """TrueType font of given size in pixels."""
+
+        font = self.fonts.get(size)
+        if font is None:
+            try:
+                font = ImageFont.truetype(FONT_FILE, size)
+            except IOError:
+                font = ImageFont.load_default()
+            self.fonts[size] = font
+
+        return font
+
+    def _glyph(self, char, size):
+        """Mask of character, rendered once per font size.
+
+        Returns
+        -------
+        (Image, int, int)
+          Mask of character, offset of its origin in the mask
+          to allow for any overhang left of the origin, and
+          advance width of character.
+        """
+
+        key = (char, size)
+        glyph = self.glyphs.get(key)
+        if glyph is None:
+            font = self._font(size)
+            ascent, descent = font.getmetrics()
+            width, _height = font.getsize(char)
+
+            # Pillow does not report advance widths, but they
+            # are given by the increase in width of repeated text
+            advance = font.getsize(char*2)[0] - width
+            origin = max(-font.getoffset(char)[0], 0)
+
+            mask = Image.new('L', (max(width + origin, 1), ascent + descent))
+            ImageDraw.Draw(mask).text((origin, 0), char, font=font, fill=255)
+            glyph = (mask, origin, advance)
+            self.glyphs[key] = glyph
+
+        return glyph
+
+    def _text_mask(self, text, size):
+        """Mask of text composed from the masks of its characters.
+
+        Labels are largely unique, so glyphs are cached rather than labels
+        as rendering text with FreeType dominates the cost of rasterizing.
+        Kerning is ignored.
+
+        Returns
+        -------
+        (Image, int, int)
+          Mask of text, offset of origin of text in the
+          mask, and advance width of text.
+        """
+
+        glyphs = [self._glyph(char, size) for char in text]
+        ascent, descent = self._font(size).getmetrics()
+
+        origin = glyphs[0][1] if glyphs else 0
+        x = origin
+        right = 1
+        positions = []
+        for glyph_mask, glyph_origin, advance in glyphs:
+            positions.append(x - glyph_origin)
+            right = max(right, x - glyph_origin + glyph_mask.size[0])
+            x += advance
+
+        mask = Image.new('L', (right, ascent + descent))
+        for (glyph_mask, _glyph_origin, _advance), glyph_x in zip(glyphs, positions):
+            mask.paste(glyph_mask, (glyph_x, 0), glyph_mask)
+
+        return mask, origin, x - origin
+
+    def _polygon_shapes(self, subpaths, fill, outline, width, even_odd=False):
+        """Shapes filling and outlining subpaths."""
+
+        shapes = []
+        if fill is not None:
+            polygons = [points for points, _closed in subpaths if len(points) > 2]
+            if even_odd and len(polygons) > 1:
+                shapes.append(('even_odd', polygons, fill))
+            else:
+                shapes.extend([('polygon', points, fill) for points in polygons])
+
+        if outline is not None:
+            for points, closed in subpaths:
+                if not points:
+                    continue
+                if closed or fill is not None:
+                    points = points + [points[0]]
+                shapes.append(('line', points, outline, width))
+
+        return shapes
+
+    def shapes(self, element):
+        """Convert element to shapes for painting.
+
+        Rasterizing stops at the first error raised by Pillow for
+        a drawing it cannot rasterize, which is kept in error, so
+        such a failure does not prevent the SVG image from being
+        written.
+
+        Parameters
+        ----------
+        element : element
+          Stream or svgwrite element.
+
+        Returns
+        -------
+        list of tuple
+          Shapes of element as (type, arguments...).
+        """
+
+        if self.error is not None:
+            return []
+
+        start = time.time()
+        try:
+            shapes = self._element_shapes(element)
+        except RASTER_ERRORS as e:
+            self.error = e
+            shapes = []
+        self.elapsed += time.time() - start
+
+        return shapes
+
+    def _element_shapes(self, element):
+        """Shapes of element."""
+
+        attribs = element.attribs
+        name = element.elementname
+
+        fill = self._color(attribs.get('fill', 'black'), attribs.get('fill-opacity'))
+        outline = self._color(attribs.get('stroke'), attribs.get('stroke-opacity'))
+        width = _length(attribs.get('stroke-width'), 0, default=1.0)
+        if width <= 0:
+            outline = None
+        width = max(int(round(width)), 1)
+
+        shapes = []
+        if name == 'line':
+            x1, y1, x2, y2 = [_length(attribs.get(a), 0) for a in ('x1', 'y1', 'x2', 'y2')]
+            if outline is not None:
+                shapes.append(('line', [(x1, y1), (x2, y2)], outline, width))
+        elif name == 'rect':
+            x = _length(attribs.get('x'), self.width)
+            y = _length(attribs.get('y'), self.height)
+            w = _length(attribs.get('width'), self.width)
+            h = _length(attribs.get('height'), self.height)
+            corners = [(x, y), (x + w, y), (x + w, y + h), (x, y + h)]
+            shapes = self._polygon_shapes([(corners, True)], fill, outline, width)
+        elif name == 'circle':
+            cx, cy, r = [_length(attribs.get(a), 0) for a in ('cx', 'cy', 'r')]
+            shapes.append(('ellipse', [cx - r, cy - r, cx + r, cy + r], fill, outline, width))
+        elif name == 'polygon':
+            points = getattr(element, 'points', None)
+            if points is None:
+                points = attribs.get('points')
+            numbers = _numbers(points)
+            points = zip(numbers[0::2], numbers[1::2])
+            shapes = self._polygon_shapes([(points, True)], fill, outline, width)
+        elif name == 'path':
+            commands = getattr(element, 'commands', None)
+            d = _path_data(commands) if commands is not None else attribs.get('d', '')
+            shapes = self._polygon_shapes(path_subpaths(d), 
+                                            fill, 
+                                            outline, 
+                                            width, 
+                                            attribs.get('fill-rule') == 'evenodd')
+        elif name == 'text' and element.text and fill is not None:
+            font_size = _numbers(attribs.get('font-size'))[0]
+            if ('%s' % attribs.get('font-size')).endswith('pt'):
+                font_size *= PT_TO_USER_UNITS
+
+            angle = cx = cy = 0.0
+            transform = ROTATE_RE.search(attribs.get('transform', ''))
+            if transform:
+                rotation = _numbers(transform.group(1)) + [0.0, 0.0]
+                angle, cx, cy = rotation[0:3]
+
+            shapes.append(('text', 
+                            element.text, 
+                            _length(attribs.get('x'), 0), 
+                            _length(attribs.get('y'), 0),
+                            font_size,
+                            attribs.get('text-anchor', 'start'),
+                            angle, cx, cy,
+                            fill))
+
+        return shapes
+
+    def _paint_text(self, text, x, y, font_size, text_anchor, angle, cx, cy, fill):
+        """Paint text with baseline at (x, y) rotated by angle about (cx, cy)."""
+
+        size = max(int(round(font_size)), 1)
+        ascent, _descent = self._font(size).getmetrics()
+        mask, origin, width = self._text_mask(text, size)
+
+        top = y - ascent
+        left = x
+        if text_anchor == 'end':
+            left = x - width
+        elif text_anchor == 'middle':
+            left = x - 0.5*width
+        left -= origin
+
+        if angle == 0:
+            self.draw.bitmap((int(round(left)), int(round(top))), mask, fill=fill)
+            return
+
+        mask_width, mask_height = mask.size
+
+        # rotate mask about its center and place it
+        # so its center lands on the rotated center
+        mask = mask.rotate(-angle, resample=Image.BILINEAR, expand=True)
+
+        cos_angle = math.cos(math.radians(angle))
+        sin_angle = math.sin(math.radians(angle))
+        mid_x = left + 0.5*mask_width - cx
+        mid_y = top + 0.5*mask_height - cy
+        rotated_x = cx + mid_x*cos_angle - mid_y*sin_angle
+        rotated_y = cy + mid_x*sin_angle + mid_y*cos_angle
+
+        self.draw.bitmap((int(round(rotated_x - 0.5*mask.size[0])), 
+                            int(round(rotated_y - 0.5*mask.size[1]))),
+                            mask, 
+                            fill=fill)
+
+    def _paint_even_odd(self, polygons, fill):
+        """Fill polygons with the even-odd rule."""
+
+        xs = [x for points in polygons for x, _y in points]
+        ys = [y for points in polygons for _x, y in points]
+        left = int(math.floor(min(xs)))
+        top = int(math.floor(min(ys)))
+        size = (int(math.ceil(max(xs))) - left + 1, int(math.ceil(max(ys))) - top + 1)
+
+        mask = Image.new('1', size)
+        for points in polygons:
+            polygon = Image.new('1', size)
+            ImageDraw.Draw(polygon).polygon([(x - left, y - top) for x, y in points], fill=1)
+            mask = ImageChops.logical_xor(mask, polygon)
+
+        self.draw.bitmap((left, top), mask.convert('L'), fill=fill)
+
+    def paint(self, shapes):
+        """Paint shapes onto image, stopping at the first rasterization error."""
+
+        if self.error is not None:
+            return
+
+        start = time.time()
+        try:
+            self._paint_shapes(shapes)
+        except RASTER_ERRORS as e:
+            self.error = e
+        self.elapsed += time.time() - start
+
+    def _paint_shapes(self, shapes):
+        """Paint each shape."""
+
+        for shape in shapes:
+            shape_type = shape[0]
+            if shape_type == 'polygon':
+                _, points, fill = shape
+                self.draw.polygon(points, fill=fill)
+            elif shape_type == 'line':
+                _, points, outline, width = shape
+                self.draw.line(points, fill=outline, width=width)
+            elif shape_type == 'ellipse':
+                _, bbox, fill, outline, width = shape
+                self.draw.ellipse(bbox, fill=fill, outline=outline, width=width)
+            elif shape_type == 'even_odd':
+                self._paint_even_odd(shape[1], shape[2])
+            elif shape_type == 'text':
+                self._paint_text(*shape[1:])
+
+    def save(self):
+        """Write image to file."""
+
+        start = time.time()
+        self.image.save(self.filename, dpi=(self.dpi, self.dpi))
+        self.elapsed += time.time() - start
@@ -24,6 +24,21 @@ __maintainer__ = 'Donovan Parks'
 __email__ = 'donovan.parks@gmail.com'
 __status__ = 'Development'
 
+import math
+from collections import OrderedDict
+
+from numpy import (asarray as np_asarray,
+                    round as np_round,
+                    ceil as np_ceil,
+                    log10 as np_log10)
+
+from drawm.svg.font_metrics import font_metrics, PT_TO_USER_UNITS
+
+# default precision of coordinates resolves a tenth
+# of a pixel when the image is printed at PRINT_DPI
+PRINT_DPI = 600
+PIXEL_FRACTION = 0.1
+
 
 def color_str(r, g, b):
     return "rgb(%d,%d,%d)" % (int(r+0.5), int(g+0.5), int(b+0.5))
@@ -37,24 +52,14 @@ def rgb_from_str(color_str):
 def donut(dwg, x, y, inner_radius, outer_radius, color, opacity=1.0, group=None, id=None):
     """Render a donut."""
     
-    path = dwg.path("M%f,%f" % (x,y), id=id)
+    d = format_path_data('M%f,%f m%f,%f a%f,%f 0 1,0 %f,%f m%f,%f a%f,%f 0 1,1 %f,%f', 
+                            [(x, y, 
+                                0, -outer_radius, outer_radius, outer_radius, 1, 0, 
+                                0, outer_radius-inner_radius, inner_radius, inner_radius, -1, 0)],
+                            dwg.coordinate_precision)[0]
+    path = dwg.path(d, id=id)
     path.fill(color=color, opacity=opacity, rule='evenodd')
     #path.stroke(color=color, width=1)
-    
-    path.push("m%f,%f" % (0, -outer_radius))
-    path.push_arc(target=(1, 0), 
-                            rotation=0, 
-                            r=outer_radius,
-                            large_arc=True,
-                            angle_dir='-',
-                            absolute=False)
-    path.push("m%f,%f" % (0, outer_radius-inner_radius))
-    path.push_arc(target=(-1, 0), 
-                            rotation=0, 
-                            r=inner_radius,
-                            large_arc=True,
-                            angle_dir='+',
-                            absolute=False)
 
     if group:
         group.add(path)
@@ -63,19 +68,130 @@ def donut(dwg, x, y, inner_radius, outer_radius, color, opacity=1.0, group=None,
         dwg.add(t)
     
     
-def render_label(dwg, x, y, 
-                    angle, 
-                    label, 
-                    font_size, 
-                    color,
-                    middle_x=False,
-                    middle_y=False,                    
-                    group=None, 
-                    id_prefix=None):
-    """Render label."""
+def format_path_data(template, coords, precision=6):
+    """Format path data for rows of coordinates.
+    
+    Rather than formatting coordinates one at a time, the template
+    is repeated for all rows and applied to all coordinates in a
+    single formatting operation.
+    
+    Parameters
+    ----------
+    template : str
+      Path data for a single row with each coordinate given as %f.
+    coords : array_like
+      Coordinates with a row for each path.
+    precision : int
+      Number of decimal places written for each coordinate.
+      
+    Returns
+    -------
+    list of str
+      Path data for each row.
+    """
+    
+    coords = np_asarray(coords, dtype=float)
+    if len(coords) == 0:
+        return []
+    
+    row_template = template.replace('%f', '%%.%df' % precision)
+    data = '\n'.join([row_template] * len(coords)) % tuple(coords.ravel().tolist())
+    return data.split('\n')
+    
+    
+def round_coords(coords, precision=6):
+    """Round coordinates of element attributes.
+    
+    Coordinates are rounded together and returned as Python
+    floats, which are written without trailing zeros.
+    
+    Parameters
+    ----------
+    coords : array_like
+      Coordinates to round.
+    precision : int
+      Number of decimal places to retain.
+      
+    Returns
+    -------
+    float or list
+      Rounded coordinates with the same shape as coords.
+    """
+    
+    return np_round(np_asarray(coords, dtype=float), precision).tolist()
+    
+    
+def default_coordinate_precision(dpi):
+    """Decimal places of coordinates for a given resolution.
+    
+    Coordinates are in pixels at the given resolution, so the
+    precision needed to resolve a fraction of a printed pixel
+    decreases as the resolution of the drawing increases.
+    """
+    
+    return max(int(np_ceil(np_log10(PRINT_DPI / (PIXEL_FRACTION * dpi)))), 0)
+    
+    
+def circle_subpath(x, y, r, precision=6):
+    """Path data for a circle drawn as two arcs."""
+    
+    return format_path_data("M%f,%f a%f,%f 0 1,0 %f,0 a%f,%f 0 1,0 %f,0", 
+                            [(x - r, y, r, r, 2*r, r, r, -2*r)], 
+                            precision)[0]
+    
+    
+def arc_subpath(x, y, r, large_arc=False, angle_dir='+', precision=6):
+    """Path data for a circular arc ending at an absolute position."""
+    
+    flags = (int(large_arc), {'+': 1, '-': 0}[angle_dir])
+    return format_path_data("A%%f,%%f 0 %d,%d %%f,%%f" % flags, 
+                            [(r, r, x, y)], 
+                            precision)[0]
+    
+    
+def rect_subpath(x, y, width, height, precision=6):
+    """Path data for a rectangle."""
+    
+    return format_path_data("M%f,%f h%f v%f h%f Z", 
+                            [(x, y, width, height, -width)], 
+                            precision)[0]
     
-    if label is None:
-        return
+    
+class StyledPaths(object):
+    """Subpaths grouped by style and written as compound paths.
+    
+    Rather than writing an element for every branch or node, the
+    path data of all primitives sharing a fill and stroke is
+    written as a single path element with many subpaths. Within a
+    style subpaths keep the order they were added, but primitives
+    of different styles are no longer interleaved.
+    """
+    
+    def __init__(self):
+        """Initialize empty set of paths."""
+        
+        self.subpaths = OrderedDict()
+        
+    def add(self, d, fill='none', fill_opacity=None, stroke=None, stroke_width=None, stroke_opacity=None):
+        """Add subpath with the given style."""
+        
+        style = (fill, fill_opacity, stroke, stroke_width, stroke_opacity)
+        self.subpaths.setdefault(style, []).append(d)
+        
+    def render(self, dwg, group, id_prefix):
+        """Add a compound path for each style to group."""
+        
+        for index, (style, subpaths) in enumerate(self.subpaths.iteritems()):
+            fill, fill_opacity, stroke, stroke_width, stroke_opacity = style
+            
+            path = dwg.path(' '.join(subpaths), id='%s_%d' % (id_prefix, index))
+            path.fill(color=fill, opacity=fill_opacity)
+            path.stroke(color=stroke, width=stroke_width, opacity=stroke_opacity)
+            group.add(path)
+            
+            
+def _text_orientation(angle, middle_x):
+    """Rendering angle, anchor, and direction of text."""
     
     # make sure angle is between -180 and 180
     if angle > 180:
@@ -95,14 +211,101 @@ def render_label(dwg, x, y,
             
     if middle_x:
         text_anchor = 'middle'
+        
+    return angle, text_anchor, direction
+    
+    
+def label_box(x, y, 
+                angle, 
+                label, 
+                font_size, 
+                middle_x=False,
+                middle_y=False):
+    """Estimate corners of bounding box of a label.
+    
+    Text extent is measured from glyph advance widths, with
+    the box placed and rotated as in render_label.
+    
+    Returns
+    -------
+    list of (float, float)
+      Corners of box in drawing order.
+    """
+    
+    angle, text_anchor, _direction = _text_orientation(angle, middle_x)
+    
+    em = PT_TO_USER_UNITS*font_size
+    width = font_metrics.text_width(label, font_size)
+    
+    if text_anchor == 'start':
+        start_x = x
+    elif text_anchor == 'end':
+        start_x = x - width
+    else:
+        start_x = x - 0.5*width
+        
+    y_label = y
+    if middle_y:
+        y_label += 0.45*font_size
+    
+    corners = [(start_x, y_label - 0.8*em),
+                (start_x + width, y_label - 0.8*em),
+                (start_x + width, y_label + 0.2*em),
+                (start_x, y_label + 0.2*em)]
+                
+    cos_angle = math.cos(math.radians(angle))
+    sin_angle = math.sin(math.radians(angle))
+    return [(x + (cx - x)*cos_angle - (cy - y)*sin_angle,
+                y + (cx - x)*sin_angle + (cy - y)*cos_angle) for cx, cy in corners]
+    
+    
+def render_label(dwg, x, y, 
+                    angle, 
+                    label, 
+                    font_size, 
+                    color,
+                    middle_x=False,
+                    middle_y=False,                    
+                    group=None, 
+                    id_prefix=None,
+                    grid=None,
+                    extents=None):
+    """Render label.
+    
+    If a label grid is given, the label is only rendered if it
+    does not overlap a label already placed in the grid. The
+    bounding box of rendered labels is added to extents if given.
+    
+    Returns
+    -------
+    bool
+      True if label was rendered, otherwise False.
+    """
+    
+    if label is None:
+        return False
+        
+    if grid is not None or extents is not None:
+        box = label_box(x, y, angle, label, font_size, middle_x, middle_y)
+        if grid is not None and not grid.insert(box):
+            return False
+            
+        if extents is not None:
+            extents.add(box)
+    
+    angle, text_anchor, direction = _text_orientation(angle, middle_x)
        
     y_label = y
     if middle_y:
         y_label += 0.45*font_size
+        
+    x, y, y_label = round_coords((x, y, y_label), dwg.coordinate_precision)
                    
-    id_label = label.replace(' ', '_')
-    if id_prefix:
-        id_label = '%s_%s' % (id_prefix, id_label)
+    id_label = None
+    if dwg.element_ids:
+        id_label = label.replace(' ', '_')
+        if id_prefix:
+            id_label = '%s_%s' % (id_prefix, id_label)
 
     t = dwg.text(label, 
                     x=[(x)], 
@@ -119,4 +322,6 @@ def render_label(dwg, x, y,
         group.add(t)
     else:
         # add to 'root' group
-        dwg.add(t)
\ No newline at end of file
+        dwg.add(t)
+        
+    return True
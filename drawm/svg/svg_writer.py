@@ -0,0 +1,768 @@
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = 'Donovan Parks'
+__copyright__ = 'Copyright 2016'
+__credits__ = ['Donovan Parks']
+__license__ = 'GPL3'
+__version__ = '0.0.1'
+__maintainer__ = 'Donovan Parks'
+__email__ = 'donovan.parks@gmail.com'
+__status__ = 'Development'
+
+import io
+import gzip
+import threading
+from Queue import Queue
+from collections import defaultdict
+
+import svgwrite
+
+DRAWING_BACKENDS = ['stream', 'svgwrite']
+
+OUTPUT_FORMATS = ['svg', 'svgz']
+
+# size of blocks of markup passed to the output file
+CHUNK_SIZE = 1 << 16
+
+# blocks waiting to be compressed by background thread
+MAX_QUEUED_CHUNKS = 16
+
+# gzip compression level of SVGZ files
+COMPRESS_LEVEL = 6
+
+# attributes moved to style classes and those given as lengths
+PRESENTATION_ATTRIBUTES = ['direction', 'fill', 'fill-opacity', 'fill-rule', 
+                            'font-family', 'font-size', 
+                            'stroke', 'stroke-opacity', 'stroke-width', 
+                            'text-anchor']
+LENGTH_ATTRIBUTES = ['font-size', 'stroke-width']
+
+
+def open_output(filename, compress):
+    """Open binary output file, gzip-compressed if requested."""
+
+    if compress:
+        return gzip.open(filename, 'wb', COMPRESS_LEVEL)
+
+    return io.open(filename, 'wb')
+
+
+class BackgroundWriter(object):
+    """Write blocks of data to a file on a background thread.
+
+    Blocks are passed to the thread through a bounded queue so
+    at most MAX_QUEUED_CHUNKS blocks are held in memory. Compression
+    by zlib releases the interpreter lock, so compressing output
+    overlaps with rendering.
+    """
+
+    def __init__(self, fileobj):
+        """Start writer thread.
+
+        Parameters
+        ----------
+        fileobj : file
+          Binary file object to write to.
+        """
+
+        self.fileobj = fileobj
+        self.error = None
+
+        self.queue = Queue(maxsize=MAX_QUEUED_CHUNKS)
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        """Write blocks until end of output is reached."""
+
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+
+            if self.error is None:
+                try:
+                    self.fileobj.write(data)
+                except Exception as e:
+                    self.error = e
+
+    def _check_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def write(self, data):
+        """Queue block of data for writing."""
+
+        self._check_error()
+        self.queue.put(data)
+
+    def close(self):
+        """Wait for all blocks to be written and close file."""
+
+        self.queue.put(None)
+        self.thread.join()
+        self.fileobj.close()
+        self._check_error()
+
+
+def _to_unicode(value):
+    """Convert value to unicode as done by svgwrite."""
+
+    if isinstance(value, str):
+        return unicode(value, encoding='utf8')
+
+    return unicode(value)
+
+
+def _flatten(values):
+    """Iterate over non-None values in nested lists and tuples."""
+
+    for value in values:
+        if isinstance(value, (list, tuple)):
+            for v in _flatten(value):
+                yield v
+        elif value is not None:
+            yield value
+
+
+def _strlist(values, separator=','):
+    """Concatenate values with separator, as done by svgwrite."""
+
+    if isinstance(values, basestring):
+        return values
+
+    return separator.join([str(value) for value in _flatten(values)])
+
+
+def _escape_attrib(text):
+    """Escape XML attribute value."""
+
+    return (text.replace('&', '&amp;')
+                .replace('<', '&lt;')
+                .replace('>', '&gt;')
+                .replace('"', '&quot;')
+                .replace('\n', '&#10;'))
+
+
+def _escape_text(text):
+    """Escape XML character data."""
+
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _is_number(value):
+    """Determine if string is a number without units."""
+
+    try:
+        float(value)
+    except ValueError:
+        return False
+
+    return True
+
+
+class StyleClasses(object):
+    """CSS classes for distinct combinations of presentation attributes.
+
+    Presentation attributes are removed from elements and replaced by a
+    class with the same style. Classes are generated separately for each
+    top-level group (e.g., 'branches-0', 'leaf_node_labels-0') so the
+    elements drawn by each set of properties can be restyled by editing
+    the style sheet.
+    """
+
+    def __init__(self):
+        """Initialize empty style sheet."""
+
+        self.classes = {}
+        self.class_count = defaultdict(int)
+        self.rules = []
+
+    def apply(self, element, prefix):
+        """Replace presentation attributes of element by a class.
+
+        Parameters
+        ----------
+        element : element
+          Element with attributes in its attribs dictionary.
+        prefix : str
+          Prefix of name of generated classes.
+        """
+
+        style = []
+        for attribute in PRESENTATION_ATTRIBUTES:
+            value = element.attribs.pop(attribute, None)
+            if value is None:
+                continue
+
+            value = _to_unicode(value)
+            if not value:
+                continue
+
+            if attribute in LENGTH_ATTRIBUTES and _is_number(value):
+                value += u'px'
+            style.append((attribute, value))
+
+        if not style:
+            return
+
+        key = (prefix, tuple(style))
+        class_name = self.classes.get(key)
+        if class_name is None:
+            class_index = self.class_count[prefix]
+            self.class_count[prefix] += 1
+            class_name = u'%s-%d' % (prefix, class_index)
+            self.classes[key] = class_name
+            rule = u'.%s{%s}' % (class_name, u';'.join([u'%s:%s' % av for av in style]))
+            self.rules.append((prefix, class_index, rule))
+
+        element.attribs['class'] = class_name
+
+    def stylesheet(self):
+        """CSS rules of all classes, ordered by name."""
+
+        return u'\n'.join([rule for _prefix, _index, rule in sorted(self.rules)])
+
+
+class StreamElement(object):
+    """SVG element serialized when added to a drawing or group.
+
+    Supports the subset of the svgwrite element interface
+    used to render trees and produces identical markup.
+    """
+
+    def __init__(self, elementname, **extra):
+        """Initialize element with attributes given as keywords."""
+
+        self.elementname = elementname
+        self.attribs = {}
+        self.text = None
+        self.update(extra)
+
+    def __setitem__(self, key, value):
+        self.attribs[key] = value
+
+    def update(self, attribs):
+        """Set attributes, mapping 'stroke_width' to 'stroke-width'."""
+
+        for key, value in attribs.items():
+            self.attribs[key.rstrip('_').replace('_', '-')] = value
+
+    def fill(self, color=None, rule=None, opacity=None):
+        """Set fill color, rule, and opacity."""
+
+        if color is not None:
+            self['fill'] = color
+        if rule is not None:
+            self['fill-rule'] = rule
+        if opacity is not None:
+            self['fill-opacity'] = opacity
+
+        return self
+
+    def stroke(self, color=None, width=None, opacity=None, linecap=None,
+                linejoin=None, miterlimit=None):
+        """Set stroke color, width, opacity, and line style."""
+
+        if color is not None:
+            self['stroke'] = color
+        if width is not None:
+            self['stroke-width'] = width
+        if opacity is not None:
+            self['stroke-opacity'] = opacity
+        if linecap is not None:
+            self['stroke-linecap'] = linecap
+        if linejoin is not None:
+            self['stroke-linejoin'] = linejoin
+        if miterlimit is not None:
+            self['stroke-miterlimit'] = miterlimit
+
+        return self
+
+    def rotate(self, angle, center=None):
+        """Rotate element by angle degrees about center."""
+
+        transform = 'rotate(%s)' % _strlist([angle, center])
+        self['transform'] = ('%s %s' % (self.attribs.get('transform', ''), transform)).strip()
+
+    def _attrib_str(self):
+        """Attributes in sorted order, omitting undefined values."""
+
+        attribs = []
+        for attribute, value in sorted(self.attribs.items()):
+            if value is not None:
+                value = _to_unicode(value)
+                if value:
+                    attribs.append(u' %s="%s"' % (attribute, _escape_attrib(value)))
+
+        return u''.join(attribs)
+
+    def tostring(self):
+        """XML representation of element."""
+
+        if self.text:
+            return u'<%s%s>%s</%s>' % (self.elementname,
+                                        self._attrib_str(),
+                                        _escape_text(_to_unicode(self.text)),
+                                        self.elementname)
+
+        return u'<%s%s />' % (self.elementname, self._attrib_str())
+
+
+class StreamPath(StreamElement):
+    """Path element with svgwrite path commands."""
+
+    def __init__(self, d=None, **extra):
+        StreamElement.__init__(self, 'path', **extra)
+        self.commands = []
+        if d:
+            self.push(d)
+
+    def push(self, *elements):
+        """Push commands and coordinates onto path."""
+
+        self.commands.extend(elements)
+
+    def push_arc(self, target, rotation, r, large_arc=True, angle_dir='+', absolute=False):
+        """Push elliptical arc command onto path."""
+
+        self.push({True: 'A', False: 'a'}[absolute])
+        if isinstance(r, (float, int)):
+            self.push(r, r)
+        else:
+            self.push(r)
+        self.push(rotation)
+        self.push('%d,%d' % (int(large_arc), {'+': 1, '-': 0}[angle_dir]))
+        self.push(target)
+
+    def tostring(self):
+        self['d'] = _to_unicode(_strlist(self.commands, ' '))
+        return StreamElement.tostring(self)
+
+
+class StreamGroup(StreamElement):
+    """Group whose elements are written as soon as all preceding content is.
+
+    Elements are serialized when added. They are written directly to the
+    output when the group is the first unfinished item of the drawing and
+    otherwise buffered as markup until the preceding items are finished.
+    """
+
+    def __init__(self, drawing, **extra):
+        StreamElement.__init__(self, 'g', **extra)
+        self.drawing = drawing
+        self.buffer = []
+        self.shapes = []
+        self.is_streaming = False
+        self.is_open = False
+        self.is_finished = False
+
+    def add(self, element):
+        """Add element to group."""
+
+        if self.is_finished:
+            raise ValueError("Elements can not be added to finished group '%s'." % self.attribs.get('id'))
+
+        markup, shapes = self.drawing.markup(element, self.attribs.get('id', 'drawing'))
+        if self.is_streaming:
+            self.open()
+            self.drawing.write(markup, shapes)
+        else:
+            self.buffer.append(markup)
+            self.shapes.extend(shapes)
+
+        return element
+
+    def open(self):
+        """Write start tag of group, if not already written."""
+
+        if not self.is_open:
+            self.drawing.write(u'<g%s>' % self._attrib_str())
+            self.is_open = True
+
+    def start_streaming(self):
+        """Write buffered elements and write subsequent elements directly."""
+
+        if self.buffer:
+            self.open()
+            self.drawing.write(u''.join(self.buffer), self.shapes)
+            self.buffer = []
+            self.shapes = []
+
+        self.is_streaming = True
+
+    def finish(self):
+        """Write any buffered elements and end of group."""
+
+        self.start_streaming()
+        if self.is_open:
+            self.drawing.write(u'</g>')
+        else:
+            self.drawing.write(u'<g%s />' % self._attrib_str())
+
+        self.is_finished = True
+
+    def tostring(self):
+        markup = u''.join(self.buffer)
+        if not markup:
+            return u'<g%s />' % self._attrib_str()
+
+        return u'<g%s>%s</g>' % (self._attrib_str(), markup)
+
+
+class StreamDrawing(object):
+    """SVG drawing written to file as elements are added.
+
+    Provides the svgwrite drawing interface used to render trees, but
+    rather than building a document tree that is serialized when saved,
+    elements are written in drawing order as soon as all content
+    preceding them has been written. Only groups that are still
+    receiving elements behind the current group are buffered.
+    A group is finished once flush is called.
+
+    Markup is passed to the output file in blocks of about CHUNK_SIZE
+    characters, which are optionally gzip-compressed as written.
+    Elements are also painted onto a raster image, if one is given,
+    as their markup is written.
+    """
+
+    def __init__(self, filename, size, compress=False, compress_thread=False, css_classes=False, raster=None):
+        """Open drawing.
+
+        Parameters
+        ----------
+        filename : str
+          Output SVG file.
+        size : (float, float)
+          Width and height of drawing.
+        compress : bool
+          Write gzip-compressed (SVGZ) file.
+        compress_thread : bool
+          Compress output on a background thread.
+        css_classes : bool
+          Style elements with CSS classes rather than attributes.
+        raster : PngWriter
+          Raster image to paint elements onto, or None.
+        """
+
+        self.filename = filename
+        self.size = size
+        self.compress = compress
+        self.compress_thread = compress_thread
+
+        self.title = None
+        self.desc = None
+
+        self.fileobj = None
+        self.chunks = []
+        self.chunk_len = 0
+        self.pending = []
+        
+        self.element_ids = True
+        
+        self.style_classes = None
+        if css_classes:
+            self.style_classes = StyleClasses()
+            
+        self.raster = raster
+
+    def set_desc(self, title=None, desc=None):
+        """Set title and description of drawing."""
+
+        self.title = title
+        self.desc = desc
+
+    def _header(self):
+        """XML declaration, root element, and document information."""
+
+        header = [u'<?xml version="1.0" encoding="utf-8" ?>\n']
+        header.append(u'<svg baseProfile="full" height="%s" version="1.1" width="%s" '
+                        'xmlns="http://www.w3.org/2000/svg" '
+                        'xmlns:ev="http://www.w3.org/2001/xml-events" '
+                        'xmlns:xlink="http://www.w3.org/1999/xlink">' % (_escape_attrib(_to_unicode(self.size[1])),
+                                                                            _escape_attrib(_to_unicode(self.size[0]))))
+        for elementname, text in [('title', self.title), ('desc', self.desc)]:
+            if text is None:
+                continue
+
+            element = StreamElement(elementname)
+            element.text = text
+            header.append(element.tostring())
+        header.append(u'<defs />')
+
+        return u''.join(header)
+
+    def write(self, markup, shapes=None):
+        """Write markup to file, opening file on first use.
+
+        Shapes of the elements in the markup are painted
+        onto the raster image in the same order.
+        """
+
+        if self.fileobj is None:
+            self.fileobj = open_output(self.filename, self.compress)
+            if self.compress and self.compress_thread:
+                self.fileobj = BackgroundWriter(self.fileobj)
+
+            self.chunks.append(self._header())
+
+        self.chunks.append(markup)
+        self.chunk_len += len(markup)
+        if self.chunk_len >= CHUNK_SIZE:
+            self._write_chunks()
+            
+        if shapes:
+            self.raster.paint(shapes)
+
+    def _write_chunks(self):
+        """Pass buffered markup to output file."""
+
+        self.fileobj.write(u''.join(self.chunks).encode('utf-8'))
+        self.chunks = []
+        self.chunk_len = 0
+
+    def markup(self, element, class_prefix):
+        """Serialize element, styled by class if requested.
+
+        Returns
+        -------
+        (unicode, list)
+          Markup of element and its shapes in the raster image.
+        """
+
+        shapes = []
+        if self.raster is not None:
+            if isinstance(element, StreamGroup):
+                shapes = element.shapes
+            else:
+                shapes = self.raster.shapes(element)
+
+        if self.style_classes is not None:
+            self.style_classes.apply(element, class_prefix)
+
+        return element.tostring(), shapes
+
+    def _write_pending(self):
+        """Write pending items up to the first unfinished group."""
+
+        while self.pending:
+            item = self.pending[0]
+            if isinstance(item, StreamGroup):
+                item.start_streaming()
+                return
+
+            self.write(*item)
+            self.pending.pop(0)
+
+    def add(self, element):
+        """Add element or group to drawing."""
+
+        if isinstance(element, StreamGroup):
+            self.pending.append(element)
+        else:
+            self.pending.append(self.markup(element, 'drawing'))
+        self._write_pending()
+
+        return element
+
+    def flush(self):
+        """Finish all groups and write all pending content."""
+
+        for item in self.pending:
+            if isinstance(item, StreamGroup):
+                item.finish()
+            else:
+                self.write(*item)
+
+        self.pending = []
+
+    def save(self):
+        """Write remaining content and close file."""
+
+        self.flush()
+        
+        # style sheet follows content as classes are
+        # only known once all elements are written
+        if self.style_classes is not None:
+            self.write(u'<style type="text/css"><![CDATA[%s]]></style>' % self.style_classes.stylesheet())
+            
+        self.write(u'</svg>')
+        self._write_chunks()
+        self.fileobj.close()
+        self.fileobj = None
+
+    def _extra(self, extra):
+        """Attributes of element, without id if ids are not written."""
+
+        if not self.element_ids:
+            extra.pop('id', None)
+
+        return extra
+
+    def g(self, **extra):
+        """Create group."""
+
+        return StreamGroup(self, **extra)
+
+    def path(self, d=None, **extra):
+        """Create path."""
+
+        return StreamPath(d, **self._extra(extra))
+
+    def line(self, start=(0, 0), end=(0, 0), **extra):
+        """Create line."""
+
+        line = StreamElement('line', **self._extra(extra))
+        line['x1'], line['y1'] = start
+        line['x2'], line['y2'] = end
+        return line
+
+    def rect(self, insert=(0, 0), size=(1, 1), rx=None, ry=None, **extra):
+        """Create rectangle."""
+
+        rect = StreamElement('rect', **self._extra(extra))
+        rect['x'], rect['y'] = insert
+        rect['width'], rect['height'] = size
+        rect['rx'] = rx
+        rect['ry'] = ry
+        return rect
+
+    def circle(self, center=(0, 0), r=1, **extra):
+        """Create circle."""
+
+        circle = StreamElement('circle', **self._extra(extra))
+        circle['cx'], circle['cy'] = center
+        circle['r'] = r
+        return circle
+
+    def polygon(self, points=[], **extra):
+        """Create polygon."""
+
+        polygon = StreamElement('polygon', **self._extra(extra))
+        polygon['points'] = ' '.join(['%s,%s' % (x, y) for x, y in points])
+        return polygon
+
+    def text(self, text, x=None, y=None, **extra):
+        """Create text."""
+
+        t = StreamElement('text', **self._extra(extra))
+        t.text = text
+        if x is not None:
+            t['x'] = _strlist(list(_flatten(x)), ' ')
+        if y is not None:
+            t['y'] = _strlist(list(_flatten(y)), ' ')
+        return t
+
+
+class SvgwriteDrawing(svgwrite.Drawing):
+    """Drawing held in memory by svgwrite and written when saved."""
+
+    def __init__(self, filename, size, compress=False, css_classes=False, raster=None):
+        svgwrite.Drawing.__init__(self, filename=filename, size=size, profile='full')
+        self.compress = compress
+        self.css_classes = css_classes
+        self.raster = raster
+        self.element_ids = True
+
+    def __getattr__(self, name):
+        """Element factories, which drop ids if ids are not written."""
+
+        factory = svgwrite.Drawing.__getattr__(self, name)
+        if name == 'g':
+            return factory
+
+        def create(*args, **extra):
+            if not self.element_ids:
+                extra.pop('id', None)
+            return factory(*args, **extra)
+
+        return create
+
+    def flush(self):
+        """Content is only written when the drawing is saved."""
+
+        pass
+
+    def _apply_style_classes(self, container, class_prefix, style_classes):
+        """Replace presentation attributes of elements by classes."""
+
+        for element in container.elements:
+            if isinstance(element, svgwrite.container.Defs) or not hasattr(element, 'attribs'):
+                continue
+
+            if isinstance(element, svgwrite.container.Group):
+                self._apply_style_classes(element, element.attribs.get('id', class_prefix), style_classes)
+            else:
+                style_classes.apply(element, class_prefix)
+
+    def _rasterize(self, container):
+        """Paint elements onto raster image in document order."""
+
+        for element in container.elements:
+            if isinstance(element, svgwrite.container.Defs) or not hasattr(element, 'attribs'):
+                continue
+
+            if isinstance(element, svgwrite.container.Group):
+                self._rasterize(element)
+            else:
+                self.raster.paint(self.raster.shapes(element))
+
+    def save(self):
+        """Write drawing to file."""
+
+        if self.raster is not None:
+            self._rasterize(self)
+
+        if self.css_classes:
+            style_classes = StyleClasses()
+            self._apply_style_classes(self, 'drawing', style_classes)
+            self.add(self.style(style_classes.stylesheet()))
+
+        fileobj = io.TextIOWrapper(open_output(self.filename, self.compress), encoding='utf-8')
+        self.write(fileobj)
+        fileobj.close()
+
+
+def create_drawing(backend, filename, size, compress=False, compress_thread=False, css_classes=False, raster=None):
+    """Create drawing with the requested backend.
+
+    Parameters
+    ----------
+    backend : str
+      Drawing backend, either 'stream' or 'svgwrite'.
+    filename : str
+      Output SVG file.
+    size : (float, float)
+      Width and height of drawing.
+    compress : bool
+      Write gzip-compressed (SVGZ) file.
+    compress_thread : bool
+      Compress output on a background thread. Only applies to
+      the stream backend, as svgwrite writes the whole drawing
+      at once when saved.
+    css_classes : bool
+      Style elements with CSS classes rather than attributes.
+    raster : PngWriter
+      Raster image to paint elements onto, or None.
+    """
+
+    if backend == 'svgwrite':
+        return SvgwriteDrawing(filename, size, compress, css_classes, raster)
+
+    return StreamDrawing(filename, size, compress, compress_thread, css_classes, raster)
@@ -30,9 +30,12 @@ import logging
 import math
 from collections import defaultdict
 
-import svgwrite
-
-from drawm.svg.svg_utils import donut, render_label
+from drawm.svg.svg_utils import (donut, 
+                                    render_label, 
+                                    circle_subpath, 
+                                    rect_subpath, 
+                                    round_coords,
+                                    StyledPaths)
 
 
 class SymbolProps:
@@ -88,6 +91,21 @@ class SymbolProps:
             
         return extent_symbols
         
+    def _symbol_offset(self, tree):
+        """Offset of first symbol column from right edge of tree.
+        
+        Symbols are placed after the widest label rendered
+        beside the leaves or lineages of the tree.
+        """
+        
+        symbol_offset = 20
+        
+        tree_end_x = tree.width + tree.start_x
+        if not tree.label_extents.is_empty():
+            symbol_offset += max(tree.label_extents.max_x - tree_end_x, 0)
+            
+        return symbol_offset
+        
     def _draw_column_lines(self, tree, symbols, symbol_offset, symbol_group):
         """Draw lines between symbol columns."""
 
@@ -100,7 +118,8 @@ class SymbolProps:
             y_start = tree.start_y - symbol_size
             y_end = tree.height + tree.start_y + symbol_size
             
-            p = self.dwg.line(start=(x, y_start), end=(x, y_end))
+            start, end = round_coords([(x, y_start), (x, y_end)], self.dwg.coordinate_precision)
+            p = self.dwg.line(start=start, end=end)
             p.fill(color='none')
             p.stroke(color='grey', opacity=0.5, width=1)
                     
@@ -117,42 +136,63 @@ class SymbolProps:
         # read symbols for each extant taxa
         extent_symbols = self._read(self.symbol_file)
 
-        symbol_group = svgwrite.container.Group(id='symbols')
+        symbol_group = self.dwg.g(id='symbols')
         self.dwg.add(symbol_group)
         
-        symbol_offset = 20
+        symbol_offset = self._symbol_offset(tree)
         self._draw_column_lines(tree, self.symbols, symbol_offset, symbol_group)
         
-        for leaf in tree.leaf_node_iter():
-            extent_id = leaf.taxon.label
+        ft = tree.flat
+        precision = self.dwg.coordinate_precision
+        merged_symbols = StyledPaths()
+        counts = []
+        for leaf_id in ft.leaves:
+            extent_id = ft.nodes[leaf_id].taxon.label
             if extent_id in extent_symbols:
                 for symbol_label, count in extent_symbols[extent_id].iteritems():
                     column, shape, color, symbol_radius = self.symbols[symbol_label]
 
-                    symbol_offset = 20 # TBD: this needs to fall after all labels???
                     x = tree.width + tree.start_x + symbol_offset + 3*symbol_radius*column
-                    y = leaf.y
-                    if shape == 'circle':
-                        s = self.dwg.circle(center=(x, y), r=symbol_radius)
-                    elif shape == 'square':
-                        s = self.dwg.rect(insert=(x-symbol_radius, y-symbol_radius),
-                                            size=(2*symbol_radius, 2*symbol_radius))
+                    y = float(ft.y[leaf_id])
+                    if self.dwg.merge_paths:
+                        if shape == 'circle':
+                            d = circle_subpath(x, y, symbol_radius, precision)
+                        elif shape == 'square':
+                            d = rect_subpath(x-symbol_radius, y-symbol_radius, 2*symbol_radius, 2*symbol_radius, precision)
+                        else:
+                            self.logger.warning('Symbol shape %s is currently not supported.' % shape)
+                            continue
+                            
+                        merged_symbols.add(d, fill=color, stroke='grey')
                     else:
-                        self.logger.warning('Symbol shape %s is currently not supported.' % shape)
-                
-                    s.fill(color=color)
-                    s.stroke(color='grey')
-                    symbol_group.add(s)
+                        center, corner = round_coords([(x, y), (x-symbol_radius, y-symbol_radius)], precision)
+                        if shape == 'circle':
+                            s = self.dwg.circle(center=center, r=symbol_radius)
+                        elif shape == 'square':
+                            s = self.dwg.rect(insert=corner,
+                                                size=(2*symbol_radius, 2*symbol_radius))
+                        else:
+                            self.logger.warning('Symbol shape %s is currently not supported.' % shape)
+                    
+                        s.fill(color=color)
+                        s.stroke(color='grey')
+                        symbol_group.add(s)
                     
                     if count > 1:
-                        render_label(self.dwg, 
-                                        x, 
-                                        y, 
-                                        0, 
-                                        str(count), 
-                                        6, 
-                                        'black',
-                                        middle_x=True,
-                                        middle_y=True,
-                                        group=symbol_group,
-                                        id_prefix='symbols_text')
+                        counts.append((x, y, count))
+                                        
+        merged_symbols.render(self.dwg, symbol_group, 'symbols')
+        
+        # render counts after symbols to ensure text is on top
+        for x, y, count in counts:
+            render_label(self.dwg, 
+                            x, 
+                            y, 
+                            0, 
+                            str(count), 
+                            6, 
+                            'black',
+                            middle_x=True,
+                            middle_y=True,
+                            group=symbol_group,
+                            id_prefix='symbols_text')
@@ -30,17 +30,32 @@ import logging
 import math
 import random
 
-import svgwrite
 import dendropy
 
-from numpy import (mean as np_mean,
-                    percentile as np_percentile)
+from numpy import (ones as np_ones,
+                    zeros as np_zeros,
+                    cumsum as np_cumsum,
+                    flatnonzero as np_flatnonzero,
+                    radians as np_radians,
+                    degrees as np_degrees,
+                    cos as np_cos,
+                    sin as np_sin,
+                    arctan2 as np_arctan2,
+                    bincount as np_bincount,
+                    column_stack as np_column_stack)
 
 from biolib.taxonomy import Taxonomy
 
-from drawm.tree.tree_utils import dist_to_ancestor, find_node
-from drawm.tree.newick_utils import parse_label
-from drawm.svg.svg_utils import render_label, color_str
+from drawm.tree.flat_tree import FlatTree
+from drawm.tree.branch_transform import branch_transformations
+from drawm.tree.tree_utils import find_nodes
+from drawm.svg.svg_utils import (render_label, 
+                                    color_str, 
+                                    format_path_data, 
+                                    arc_subpath,
+                                    round_coords,
+                                    StyledPaths)
+from drawm.svg.label_grid import LabelExtents
 
 
 class TreeProps:
@@ -112,7 +127,7 @@ class TreeProps:
                     assert self.ladderize in ['DEFAULT', 'TOP', 'BOTTOM']
                 elif attribute == 'branch_transformation':
                     self.branch_transformation = values[0]
-                    assert self.branch_transformation in ['NONE', 'CLADOGRAM']
+                    assert self.branch_transformation in ['NONE'] + list(branch_transformations)
                 elif attribute == 'width':
                     self.width = float(values[0])*self.dwg.canvas_width
                 elif attribute == 'height':
@@ -210,49 +225,29 @@ class TreeProps:
                 else:
                     self.logger.warning('[TreeProps] Unexpected attribute: %s' % attribute)
                     
-    def _cladogram(self, tree):
-        """Transform branch lengths to form a cladogram."""
-        
-        # get depth of all nodes
-        tree.seed_node.depth = 0
-        for n in tree.preorder_node_iter():
-            if n is not tree.seed_node:
-                n.depth = n.parent_node.depth+1
-                
-        # get deepest leaf node for each node
-        for n in tree.preorder_node_iter():
-            if n.is_leaf():
-                n.deepest_leaf = 0
-            else:
-                deepest_leaf = 0
-                for leaf in n.leaf_iter():
-                    if leaf.depth > deepest_leaf:
-                        deepest_leaf = leaf.depth
-                        
-                n.deepest_leaf = deepest_leaf - n.depth
-        
-        # rescale branches
-        for n in tree.preorder_node_iter():
-            if n is not tree.seed_node:
-                n.edge.length = n.parent_node.deepest_leaf - n.deepest_leaf
-                
     def _prune(self, tree):
         """Prune tree."""
         
         rank_label, num_genomes_to_retain = self.prune_by_taxon
         self.logger.info('Pruning tree to %d taxa at each %s.' % (num_genomes_to_retain, rank_label))
         
+        # pruning changes the tree so labels are decoded
+        # using a temporary flattened copy of the tree
+        ft = FlatTree(tree)
+        
         taxa_to_retain = set()
-        for node in tree.preorder_node_iter():
-            _support, taxon, _auxiliary_info = parse_label(node.label)
-            
-            if taxon:
-                most_specific_taxon = taxon.split(';')[-1].strip()
+        for node_id in xrange(ft.num_nodes):
+            if ft.is_leaf[node_id]:
+                continue
+                
+            taxonomy = ft.taxonomy[node_id]
+            if taxonomy:
+                most_specific_taxon = taxonomy[-1].strip()
                 most_specific_rank_prefix = Taxonomy.rank_prefixes.index(most_specific_taxon[0:3])
                 most_specific_rank_label = Taxonomy.rank_labels[most_specific_rank_prefix]
                 
                 if most_specific_rank_label == rank_label:
-                    taxa = [leaf.taxon for leaf in node.leaf_iter()]
+                    taxa = [ft.nodes[leaf_id].taxon for leaf_id in ft.leaf_indices(node_id)]
                     selected = random.sample(taxa, min(len(taxa), num_genomes_to_retain))
                     taxa_to_retain.update(selected)
                     
@@ -274,39 +269,17 @@ class TreeProps:
         tree.width = self.width
         tree.height = self.height
         
+        # spatial index of placed labels, if labels are to be decluttered,
+        # and collapsed lineages with a label placed in this index
+        tree.label_grid = None
+        tree.placed_collapsed = None
+        
+        # bounding box of labels beside leaves and lineages
+        tree.label_extents = LabelExtents()
+        
         # check if tree needs to be pruned
         if self.prune_by_taxon:
             self._prune(tree)
-        
-        # calculate number of leaf nodes below each node
-        # and deepest node in tree
-        tree.deepest_node = 0
-        for node in tree.postorder_node_iter():
-            if node.is_leaf():
-                node.num_leaves = 1
-                dist_to_root = dist_to_ancestor(node, tree.seed_node)
-                if dist_to_root > tree.deepest_node :
-                    tree.deepest_node  = dist_to_root
-            else:
-                node.num_leaves = sum([c.num_leaves for c in node.child_node_iter()])
-                
-        self.logger.info('Total number of leaves: %d' % tree.seed_node.num_leaves)
-        self.logger.info('Deepest leaf node: %.2f' % tree.deepest_node)
-                                            
-        # set default node attributes
-        num_taxa = 0
-        for tree_id, node in enumerate(tree.preorder_node_iter()):
-            node.id = tree_id
-            if node.is_leaf():
-                num_taxa += 1
-                
-            node.is_collapsed = False
-            node.is_collapsed_root = False
-            node.angle = 0
-            node.x_dir = 1
-            node.y_dir = 0
-            
-        self.logger.info('Tree contains %d taxa.' % num_taxa)
          
         # ladderize tree as requested
         if self.ladderize == 'TOP':
@@ -314,22 +287,35 @@ class TreeProps:
         elif self.ladderize == 'BOTTOM':
             tree.ladderize(ascending=True)
             
+        # flatten tree into arrays used by all
+        # subsequent layout and rendering steps
+        tree.flat = FlatTree(tree)
+        ft = tree.flat
+        
         # transform branches
-        if self.branch_transformation == 'CLADOGRAM':
-            self._cladogram(tree)
+        if self.branch_transformation != 'NONE':
+            transform = branch_transformations[self.branch_transformation]
+            ft.set_edge_lengths(transform(ft))
+        
+        # find deepest node in tree
+        tree.deepest_node = float(ft.root_dist[ft.leaves].max())
+                
+        self.logger.info('Total number of leaves: %d' % ft.num_leaves[0])
+        self.logger.info('Deepest leaf node: %.2f' % tree.deepest_node)
+        self.logger.info('Tree contains %d taxa.' % len(ft.leaves))
             
         return tree
         
-    def _collapsed_leaves(self, node):
+    def _collapsed_leaves(self, num_leaves):
         """Number of leaves spanned by collapsed lineage."""
     
         num_collapsed_leaves = 0
         if self.collapse_wedge_base_method == 'FIXED_WIDTH':
             num_collapsed_leaves = self.collapse_wedge_scaling
         elif self.collapse_wedge_base_method == 'PROPORTIONAL':
-            num_collapsed_leaves = max(2, self.collapse_wedge_scaling * node.num_leaves)
+            num_collapsed_leaves = max(2, self.collapse_wedge_scaling * num_leaves)
         elif self.collapse_wedge_base_method == 'LOG':
-            num_collapsed_leaves = max(2, math.log(node.num_leaves, self.collapse_wedge_scaling))
+            num_collapsed_leaves = max(2, math.log(num_leaves, self.collapse_wedge_scaling))
         else:
             self.logger.error('Unrecognized wedge base method: %s' % self.collapse_wedge_base_method)
             sys.exit(-1)
@@ -339,48 +325,87 @@ class TreeProps:
     def _collapse(self, tree):
         """Mark nodes in collapsed lineages."""
         
+        ft = tree.flat
+        
         if not self.show_collapsed:
-            return tree.seed_node.num_leaves, 0
+            return ft.num_leaves[0], 0
             
         # find nodes to be collapsed
+        lineage_names = list(self.collapse_map)
+        node_ids = find_nodes(tree, lineage_names)
+        
         new_collapse_map = {}
-        for lineage_name, data in self.collapse_map.iteritems():
-            node = find_node(tree, lineage_name)
-
-            if node:
-                new_collapse_map[node] = data
+        for lineage_name, node_id in zip(lineage_names, node_ids):
+            if node_id != -1:
+                new_collapse_map[node_id] = self.collapse_map[lineage_name]
             else:
                 self.logger.warning('Failed to identify node with label: %s.' % lineage_name)
             
         self.collapse_map = new_collapse_map
            
-        # mark nodes in collapsed linages 
-        num_leaves_layout = 0
+        # mark nodes in collapsed lineages with a single pass over
+        # collapsed roots in preorder, skipping any root nested within
+        # an already collapsed lineage
+        num_leaves_layout = ft.num_leaves[0]
         num_collapsed_lineages = 0
-           
-        stack = []
-        stack.append(tree.seed_node)
-        while stack:
-            node = stack.pop()
-            node.is_collapsed = False
-            node.is_collapsed_root = False
-            
-            if node in self.collapse_map:
-                num_collapsed_lineages += 1
-                node.is_collapsed_root = True 
-                for n in node.preorder_iter(lambda n: n != node):
-                    n.is_collapsed = True
-                    
-                num_leaves_layout += self._collapsed_leaves(node)
-            else:
-                for c in node.child_node_iter():
-                    stack.append(c)
-                    
-                if node.is_leaf():
-                    num_leaves_layout += 1
+        lineage_end = 0
+        for node_id in sorted(self.collapse_map):
+            if node_id < lineage_end:
+                continue
+                
+            lineage_end = ft.subtree_end(node_id)
+            ft.is_collapsed_root[node_id] = True
+            ft.is_collapsed[node_id+1:lineage_end] = True
+            ft.collapse_root[node_id:lineage_end] = node_id
+            
+            num_collapsed_lineages += 1
+            num_leaves_layout += self._collapsed_leaves(ft.num_leaves[node_id]) - ft.num_leaves[node_id]
 
         return num_leaves_layout, num_collapsed_lineages
                         
+    def _leaf_positions(self, tree, step_size):
+        """Position leaves at equal steps along the layout axis.
+        
+        Each leaf occupies a single slot, except for collapsed lineages
+        which occupy the number of slots given by _collapsed_leaves. All
+        leaves in a collapsed lineage are placed at the midpoint of
+        these slots.
+        
+        Parameters
+        ----------
+        tree : Tree
+          Tree with collapsed lineages marked.
+        step_size : float
+          Distance between adjacent slots.
+          
+        Returns
+        -------
+        ndarray
+          Position of each leaf in tree order relative to the first slot.
+        ndarray
+          Extent of each collapsed lineage (0 for all other nodes).
+        """
+        
+        ft = tree.flat
+        
+        # slots of a collapsed lineage are assigned to its last leaf
+        # so every leaf in the lineage starts at the same slot
+        leaf_slots = np_ones(len(ft.leaves))
+        leaf_offset = np_zeros(len(ft.leaves))
+        collapsed_extent = np_zeros(ft.num_nodes)
+        for node_id in np_flatnonzero(ft.is_collapsed_root):
+            first, last = ft.leaf_range(node_id)
+            num_slots = self._collapsed_leaves(ft.num_leaves[node_id])
+            collapsed_extent[node_id] = (num_slots - 1) * step_size
+            
+            leaf_slots[first:last-1] = 0
+            leaf_slots[last-1] = num_slots
+            leaf_offset[first:last] = 0.5*collapsed_extent[node_id]
+            
+        start_slot = np_cumsum(leaf_slots) - leaf_slots
+        
+        return start_slot*step_size + leaf_offset, collapsed_extent
+        
     def _circular_layout(self, tree):
         """Calculate position of nodes in circular tree layout."""
 
@@ -393,88 +418,57 @@ class TreeProps:
 
         # calculate position of each node in x,y plane
         self.logger.info('Performing circular layout.')
-        cur_leaf_angle = self.rotation
+        ft = tree.flat
+        ft.rel_depth[:] = (ft.root_dist / tree.deepest_node) * self.width
         angle_step_size = self.arc / (num_leaves_layout - 1.0)
-        in_collapsed_lineage = set()
-        for node in tree.postorder_node_iter():
-            if node.is_leaf():
-                if node.is_collapsed:
-                    if node in in_collapsed_lineage:
-                        # set node at midpoint of collapsed lineage
-                        in_collapsed_lineage.remove(node)
-                        node.collapsed_angle = collapsed_angle
-                        angle = angle_collapsed_lineage
-                    else:
-                        # first leaf in collapsed lineage so
-                        # find root of collapsed subtree
-                        collapse_root = node.parent_node
-                        while not collapse_root.is_collapsed_root:
-                            collapse_root = collapse_root.parent_node
-
-                        # mark all leaves in this collapsed lineage
-                        in_collapsed_lineage = set([leaf for leaf in collapse_root.leaf_iter()])
-                        in_collapsed_lineage.remove(node)
-       
-                        # calculate angle of collapsed lineage
-                        collapsed_angle = (self._collapsed_leaves(collapse_root) - 1) * angle_step_size
-                        collapse_root.collapsed_angle = collapsed_angle
-                        node.collapsed_angle = collapsed_angle
-                        
-                        # set node at midpoint of angle
-                        angle_collapsed_lineage = cur_leaf_angle + 0.5*collapsed_angle
-                        angle = angle_collapsed_lineage
-
-                        # advance passed the collapsed lineage
-                        cur_leaf_angle += angle_step_size + collapsed_angle
+        
+        # leaves are laid out at equal angles around the root
+        leaf_pos, ft.collapsed_angle[:] = self._leaf_positions(tree, angle_step_size)
+        leaf_angle = np_radians(self.rotation + leaf_pos)
+        ft.x_dir[ft.leaves] = np_cos(leaf_angle)
+        ft.y_dir[ft.leaves] = np_sin(leaf_angle)
+        
+        # internal nodes are placed at the circular mean of their children,
+        # which is computed from the leaves up by walking preorder backwards
+        x_dir = ft.x_dir.tolist()
+        y_dir = ft.y_dir.tolist()
+        sum_x = [0.0] * ft.num_nodes
+        sum_y = [0.0] * ft.num_nodes
+        is_leaf = ft.is_leaf.tolist()
+        parent = ft.parent.tolist()
+        first_child = ft.first_child.tolist()
+        for node_id in xrange(ft.num_nodes - 1, -1, -1):
+            if not is_leaf[node_id]:
+                norm = math.hypot(sum_x[node_id], sum_y[node_id])
+                if norm > 0:
+                    x_dir[node_id] = sum_x[node_id] / norm
+                    y_dir[node_id] = sum_y[node_id] / norm
                 else:
-                    # leaf nodes are layout at equal angles around the rooted
-                    angle = cur_leaf_angle
-                    cur_leaf_angle = (cur_leaf_angle + angle_step_size) % 360
-            else:      
-                # internal nodes are placed at angle between children
-                angles = []
-                for c in node.child_node_iter():
-                    angles.append(c.angle)
-                    
-                if len(angles) != 2:
-                    print 'Not 2 children?', len(angles), angles
+                    # children are evenly spread around the
+                    # circle so use direction of first child
+                    c = first_child[node_id]
+                    x_dir[node_id] = x_dir[c]
+                    y_dir[node_id] = y_dir[c]
                 
-                angle_diff = abs(max(angles) - min(angles))
-                if angle_diff < 180:
-                    angle = (sum(angles) / 2.0) % 360
-                else:
-                    angle = ((sum(angles) + 360.0) / 2.0) % 360
-                     
-            depth = dist_to_ancestor(node, tree.seed_node)
-            rel_depth = (depth / tree.deepest_node ) * self.width
+            p = parent[node_id]
+            if p != -1:
+                sum_x[p] += x_dir[node_id]
+                sum_y[p] += y_dir[node_id]
                 
-            angle_rad = math.radians(angle)
-            cos_angle = math.cos(angle_rad)
-            sin_angle = math.sin(angle_rad)
-            x = rel_depth * cos_angle + tree.start_x
-            y = rel_depth * sin_angle + tree.start_y
-            
-            # save position information for node
-            node.angle = angle
-            node.x_dir = cos_angle
-            node.y_dir = sin_angle
-            node.x = x
-            node.y = y
-            node.rel_depth = rel_depth
+        ft.x_dir[:] = x_dir
+        ft.y_dir[:] = y_dir
+        ft.angle[:] = np_degrees(np_arctan2(ft.y_dir, ft.x_dir)) % 360
+        
+        # save position information for all nodes
+        ft.x[:] = ft.rel_depth * ft.x_dir + tree.start_x
+        ft.y[:] = ft.rel_depth * ft.y_dir + tree.start_y
             
         # layout corners
-        for node in tree.postorder_node_iter():
-            if node == tree.seed_node:
-                node.corner_x = node.x - 1
-                node.corner_y = node.y
-                continue
-                
-            corner_angle_rad = math.radians(node.angle)
-            corner_x = node.parent_node.rel_depth * math.cos(corner_angle_rad) + tree.start_x
-            corner_y = node.parent_node.rel_depth * math.sin(corner_angle_rad) + tree.start_y
-            
-            node.corner_x = corner_x
-            node.corner_y = corner_y
+        parent_rel_depth = ft.rel_depth[ft.parent[1:]]
+        ft.corner_x[1:] = parent_rel_depth * ft.x_dir[1:] + tree.start_x
+        ft.corner_y[1:] = parent_rel_depth * ft.y_dir[1:] + tree.start_y
+        ft.corner_x[0] = ft.x[0] - 1
+        ft.corner_y[0] = ft.y[0]
                         
     def _rectangular_layout(self, tree):
         """Calculate position of nodes in rectangular tree layout."""
@@ -490,67 +484,35 @@ class TreeProps:
 
         # calculate position of each node in x,y plane
         self.logger.info('Performing rectangular layout.')
+        ft = tree.flat
+        ft.rel_depth[:] = (ft.root_dist / tree.deepest_node) * self.width
+        ft.x[:] = ft.rel_depth + border_x
+        
         y_step = float(self.height) / (num_leaves_layout - 1.0)
-        y_pos = border_y
-        in_collapsed_lineage = set()
-        for node in tree.postorder_node_iter():
-            depth = dist_to_ancestor(node, tree.seed_node)
-            node.rel_depth = (depth / tree.deepest_node ) * self.width    
-            node.x = node.rel_depth + border_x
-            
-            if node.is_leaf():
-                if node.is_collapsed:
-                    if node in in_collapsed_lineage:
-                        # set node at midpoint of collapsed lineage
-                        in_collapsed_lineage.remove(node)
-                        node.y = collapse_y
-                        node.collapse_height = collapsed_height
-                    else:
-                        # first leaf in collapsed lineage so
-                        # find root of collapsed subtree
-                        collapse_root = node.parent_node
-                        while not collapse_root.is_collapsed_root:
-                            collapse_root = collapse_root.parent_node
-
-                        # mark all leaves in this collapsed lineage
-                        in_collapsed_lineage = set([leaf for leaf in collapse_root.leaf_iter()])
-                        in_collapsed_lineage.remove(node)
-       
-                        # calculate height of collapsed lineage
-                        collapsed_height = (self._collapsed_leaves(collapse_root) - 1) * y_step
-                        collapse_root.collapsed_height = collapsed_height
-                        node.collapsed_height = collapsed_height
-                        
-                        # set node at midpoint of collapsed lineage
-                        collapse_y = y_pos + 0.5*collapsed_height
-                        node.y = collapse_y
-
-                        # advance passed the collapsed lineage
-                        y_pos += y_step + collapsed_height
-                else:
-                    node.y = y_pos
-                    y_pos += y_step
-            else:
-                if node.is_collapsed:
-                    # set node at midpoint of collapsed lineage
-                    node.y = node.child_node_iter().next().y
-                else:
-                    
-                    # put node at midpoint of its children
-                    y_children = []
-                    for c in node.child_node_iter():
-                        y_children.append(c.y)
-                    node.y = np_mean(y_children)
+        leaf_pos, ft.collapsed_height[:] = self._leaf_positions(tree, y_step)
+        ft.y[ft.leaves] = leaf_pos + border_y
+        
+        # put internal nodes at the mean of their children,
+        # which is computed from the leaves up by walking preorder backwards
+        y = ft.y.tolist()
+        sum_y = [0.0] * ft.num_nodes
+        num_children = np_bincount(ft.parent[1:], minlength=ft.num_nodes).tolist()
+        parent = ft.parent.tolist()
+        for node_id in xrange(ft.num_nodes - 1, -1, -1):
+            if num_children[node_id]:
+                y[node_id] = sum_y[node_id] / num_children[node_id]
                 
-        # layout corners  
-        for node in tree.postorder_node_iter():
-            if node == tree.seed_node:
-                node.corner_x = node.x - 0.001*self.width
-                node.corner_y = node.y
-                continue
+            p = parent[node_id]
+            if p != -1:
+                sum_y[p] += y[node_id]
                 
-            node.corner_x = node.parent_node.x
-            node.corner_y = node.y
+        ft.y[:] = y
+                
+        # layout corners  
+        ft.corner_x[0] = ft.x[0] - 0.001*self.width
+        ft.corner_y[0] = ft.y[0]
+        ft.corner_x[1:] = ft.x[ft.parent[1:]]
+        ft.corner_y[1:] = ft.y[1:]
             
     def layout(self, tree):
         """Layout tree."""
@@ -560,252 +522,330 @@ class TreeProps:
         elif self.display_method == 'RECTANGULAR':
             self._rectangular_layout(tree)
             
-    def _node_id_label(self, node):
+    def _node_id_label(self, tree, node_id):
         """Get unique ID identifying node."""
         
-        _support, taxon, _aux_info = parse_label(node.label)
-        if node.is_leaf():
-            _support, taxon, _aux_info = parse_label(node.taxon.label)
-        
+        taxon = tree.flat.taxon[node_id]
         if taxon:
             id_label = 'branch_%s' % taxon.replace(' ', '_')
         else:
-            id_label = 'branch_%d' % node.id
+            id_label = 'branch_%d' % node_id
             
         return id_label
         
-    def _collapsed_side_lengths(self, tree, node):
-        """Get length of sides for collapsed lineages."""
+    def _branch_nodes(self, tree):
+        """Nodes with a branch to their parent drawn, in postorder."""
+        
+        ft = tree.flat
+        postorder = ft.postorder
+        return postorder[(postorder != 0) & ~ft.is_collapsed[postorder]]
+        
+    def _render_branches(self, tree, node_ids, branch_data, branch_group):
+        """Render branches from path data of each node."""
+        
+        if self.dwg.merge_paths:
+            merged_branches = StyledPaths()
+            merged_branches.add(' '.join(branch_data), 
+                                stroke='black', 
+                                stroke_width=self.branch_width)
+            merged_branches.render(self.dwg, branch_group, 'branches')
+            return
+            
+        for node_id, d in zip(node_ids, branch_data):
+            id_label = None
+            if self.dwg.element_ids:
+                id_label = self._node_id_label(tree, node_id)
+                
+            branch = self.dwg.path(d, id=id_label)
+            branch.fill(color='none')
+            branch.stroke(color='black', width=self.branch_width)
+            branch_group.add(branch)
+        
+    def _collapsed_side_lengths(self, tree):
+        """Get length of sides for all collapsed lineages."""
         
         # get length of branches
-        leaf_dists = []
-        for leaf in node.preorder_iter(lambda n: n.is_leaf()):
-            leaf_dists.append(dist_to_ancestor(leaf, node))
-                                    
-        side1, side2 = np_percentile(leaf_dists, 
+        ft = tree.flat
+        collapsed_roots = np_flatnonzero(ft.is_collapsed_root)
+        sides = ft.tip_dist_percentiles(collapsed_roots, 
                                             [self.collapse_branch1_percentile, 
                                             self.collapse_branch2_percentile])
-        side1 = (side1/tree.deepest_node) * self.height
-        side2 = (side2/tree.deepest_node) * self.height
+        sides = (sides/tree.deepest_node) * self.height
         
         if tree.display_method == 'RECTANGULAR':
             if self.collapse_display_method == 'TRIANGLE':
-                side2 = 0
+                sides[:, 1] = 0
 
-        return side1, side2
+        return dict(zip(collapsed_roots, map(tuple, sides.tolist())))
+        
+    def _collapsed_label(self, tree, node_id, sides):
+        """Label of collapsed lineage and its position.
         
-    def _render_collapsed_circular(self, tree, node, collapsed_group, collapsed_text_group):
+        Returns
+        -------
+        (str, float, float, float)
+          Label, position of label, and angle of label.
+        """
+        
+        side1, side2 = sides
+        
+        ft = tree.flat
+        lineage_name = self.collapse_map[node_id][0]
+        node_x = float(ft.x[node_id])
+        node_y = float(ft.y[node_id])
+        
+        if tree.display_method == 'CIRCULAR':
+            if self.collapse_display_method == 'WEDGE' and float(ft.collapsed_angle[node_id]) >= 120:
+                # wedge is closed by an arc at the mean length of its sides
+                side1 = side2 = 0.5*(side1 + side2)
+                
+            if self.collapse_label_position == 'INTERNAL':
+                offset = 0.01*self.inch
+            elif self.collapse_label_position == 'EXTERNAL':
+                offset = max(side1, side2) + 0.01*self.inch
+            label_x = node_x + offset*float(ft.x_dir[node_id])
+            label_y = node_y + offset*float(ft.y_dir[node_id])
+            label_angle = float(ft.angle[node_id])
+            
+            label = lineage_name
+            if self.collapse_show_leaf_count:
+               label += ' | %d' % ft.num_leaves[node_id]
+        elif tree.display_method == 'RECTANGULAR':
+            if self.collapse_label_position == 'INTERNAL':
+                label_x = node_x + 0.01*self.inch
+            elif self.collapse_label_position == 'EXTERNAL':
+                label_x = max(node_x + side1, node_x + side2)
+            label_y = node_y
+            label_angle = 0
+            
+            label = lineage_name
+            if self.collapse_show_leaf_count:
+               label += ' [%d]' % ft.num_leaves[node_id]
+               
+        return label, label_x, label_y, label_angle
+        
+    def collapsed_labels(self, tree):
+        """Labels of collapsed lineages to be placed among other labels.
+        
+        Parameters
+        ----------
+        tree : Tree
+          Tree with layout of nodes.
+          
+        Returns
+        -------
+        list of (int, str, float, float, float, float)
+          Collapsed lineage node, label, position of label, 
+          angle of label, and font size of label.
+        """
+        
+        if not self.show_tree or not self.collapse_show_labels:
+            return []
+            
+        ft = tree.flat
+        node_ids = self._branch_nodes(tree)
+        collapsed_sides = self._collapsed_side_lengths(tree)
+        
+        labels = []
+        for node_id in node_ids[ft.is_collapsed_root[node_ids]]:
+            label, label_x, label_y, label_angle = self._collapsed_label(tree, node_id, collapsed_sides[node_id])
+            labels.append((node_id, label, label_x, label_y, label_angle, self.collapse_font_size))
+            
+        return labels
+        
+    def _render_collapsed_label(self, tree, node_id, sides, collapsed_text_group):
+        """Render label of collapsed lineage, unless dropped when placing labels."""
+        
+        if not self.collapse_show_labels:
+            return
+            
+        if tree.placed_collapsed is not None and node_id not in tree.placed_collapsed:
+            return
+            
+        label, label_x, label_y, label_angle = self._collapsed_label(tree, node_id, sides)
+        render_label(self.dwg, 
+                        label_x, 
+                        label_y, 
+                        label_angle, 
+                        label, 
+                        self.collapse_font_size, 
+                        self.collapse_font_color,
+                        middle_y=True,
+                        group=collapsed_text_group,
+                        extents=tree.label_extents)
+        
+    def _render_collapsed_circular(self, tree, node_id, sides, collapsed_group, collapsed_text_group):
         """Render collapsed lineage in circular tree."""
         
-        side1, side2 = self._collapsed_side_lengths(tree, node) 
+        side1, side2 = sides
 
         # render collapsed lineage
-        _support, taxon, _aux_info = parse_label(node.label)
-        lineage_name, color, alpha, stroke_width, stroke_color = self.collapse_map[node]
+        ft = tree.flat
+        lineage_name, color, alpha, stroke_width, stroke_color = self.collapse_map[node_id]
+        
+        node_x = float(ft.x[node_id])
+        node_y = float(ft.y[node_id])
+        node_angle = float(ft.angle[node_id])
+        rel_depth = float(ft.rel_depth[node_id])
+        collapsed_angle = float(ft.collapsed_angle[node_id])
 
-        start_angle = math.radians(node.angle + 0.5*node.collapsed_angle)
+        start_angle = math.radians(node_angle + 0.5*collapsed_angle)
         cos_start_angle = math.cos(start_angle)
         sin_start_angle = math.sin(start_angle)
-        start_x = (side1 + node.rel_depth) * cos_start_angle + tree.start_x
-        start_y = (side1 + node.rel_depth) * sin_start_angle + tree.start_y
+        start_x = (side1 + rel_depth) * cos_start_angle + tree.start_x
+        start_y = (side1 + rel_depth) * sin_start_angle + tree.start_y
         
-        end_angle = math.radians(node.angle - 0.5*node.collapsed_angle)
+        end_angle = math.radians(node_angle - 0.5*collapsed_angle)
         cos_end_angle = math.cos(end_angle)
         sin_end_angle = math.sin(end_angle)
-        end_x = (side2 + node.rel_depth) * cos_end_angle + tree.start_x
-        end_y = (side2 + node.rel_depth) * sin_end_angle + tree.start_y
+        end_x = (side2 + rel_depth) * cos_end_angle + tree.start_x
+        end_y = (side2 + rel_depth) * sin_end_angle + tree.start_y
         
+        precision = self.dwg.coordinate_precision
         lineage_id = lineage_name.replace(' ', '_')
         if self.collapse_display_method == 'TRIANGLE':
             pts = []
             pts.append((start_x, start_y))
-            pts.append((node.x, node.y))
+            pts.append((node_x, node_y))
             pts.append((end_x, end_y))
-            p = self.dwg.polygon(points=pts, id='collapsed_%s' % lineage_id)
+            p = self.dwg.polygon(points=round_coords(pts, precision), id='collapsed_%s' % lineage_id)
         elif self.collapse_display_method == 'WEDGE':
             # find corners of arc
-            start_corner_x = node.rel_depth * cos_start_angle + tree.start_x 
-            start_corner_y = node.rel_depth * sin_start_angle + tree.start_y
+            start_corner_x = rel_depth * cos_start_angle + tree.start_x 
+            start_corner_y = rel_depth * sin_start_angle + tree.start_y
             
-            end_corner_x = node.rel_depth * cos_end_angle + tree.start_x 
-            end_corner_y = node.rel_depth * sin_end_angle + tree.start_y
+            end_corner_x = rel_depth * cos_end_angle + tree.start_x 
+            end_corner_y = rel_depth * sin_end_angle + tree.start_y
             
             # draw top arc that runs through collapsed node    
-            p = self.dwg.path("M%f,%f" % (start_corner_x, start_corner_y), 
+            p = self.dwg.path(format_path_data("M%f,%f", [(start_corner_x, start_corner_y)], precision)[0], 
                                     id='collapsed_%s' % lineage_id)
-            p.push_arc(target=(end_corner_x, end_corner_y), 
-                            rotation=0, 
-                            r=node.rel_depth,
-                            large_arc=(node.collapsed_angle > 180),
-                            angle_dir='-',
-                            absolute=True)
-            p.push('L%f,%f' % (end_x, end_y))
-            
-            if node.collapsed_angle < 120:
+            p.push(arc_subpath(end_corner_x, 
+                                end_corner_y, 
+                                rel_depth,
+                                large_arc=(collapsed_angle > 180),
+                                angle_dir='-',
+                                precision=precision))
+            p.push(*format_path_data('L%f,%f', [(end_x, end_y)], precision))
+            
+            if collapsed_angle < 120:
                 # draw wedge
-                p.push('L%f,%f' % (start_x, start_y))
+                p.push(*format_path_data('L%f,%f', [(start_x, start_y)], precision))
             else:
                 # draw an arc instead of a straight line
                 # as the line is likely to produce a 
                 # very awkward looking wedge
-                p.push_arc(target=(start_x, start_y), 
-                            rotation=0, 
-                            r=0.5*(side1 + side2) + node.rel_depth,
-                            large_arc=(node.collapsed_angle > 180),
-                            angle_dir='+',
-                            absolute=True)
-                side1 = side2 = 0.5*(side1 + side2) # change for correct label placement
+                p.push(arc_subpath(start_x, 
+                                    start_y, 
+                                    0.5*(side1 + side2) + rel_depth,
+                                    large_arc=(collapsed_angle > 180),
+                                    angle_dir='+',
+                                    precision=precision))
             p.push('Z')
                 
         p.fill(color=color, opacity=alpha)
         p.stroke(color=stroke_color, width=stroke_width)
         collapsed_group.add(p)
         
-        # render label
-        if self.collapse_show_labels:
-            if self.collapse_label_position == 'INTERNAL':
-                label_x = node.x + 0.01*self.inch*node.x_dir
-                label_y = node.y + 0.01*self.inch*node.y_dir
-            elif self.collapse_label_position == 'EXTERNAL':
-                offset = max(side1, side2) + 0.01*self.inch
-                label_x = node.x + offset*node.x_dir
-                label_y = node.y + offset*node.y_dir
-               
-            label = lineage_name
-            if self.collapse_show_leaf_count:
-               label += ' | %d' % node.num_leaves
-            
-            render_label(self.dwg, 
-                            label_x, 
-                            label_y, 
-                            node.angle, 
-                            label, 
-                            self.collapse_font_size, 
-                            self.collapse_font_color,
-                            middle_y=True,
-                            group=collapsed_text_group)
+        self._render_collapsed_label(tree, node_id, sides, collapsed_text_group)
             
     def _render_circular(self, tree):
         """Render circular tree."""
 
-        branch_group = svgwrite.container.Group(id='branches')
+        branch_group = self.dwg.g(id='branches')
         self.dwg.add(branch_group)
         
-        collapsed_group = svgwrite.container.Group(id='collapsed_lineages')
+        collapsed_group = self.dwg.g(id='collapsed_lineages')
         self.dwg.add(collapsed_group)
         
-        collapsed_text_group = svgwrite.container.Group(id='collapsed_lineages_text')
+        collapsed_text_group = self.dwg.g(id='collapsed_lineages_text')
         self.dwg.add(collapsed_text_group)
         
         # draw all tree branches
-        for node in tree.postorder_node_iter():
-            if node.is_collapsed:
-                continue
-                
-            if node.parent_node:
-                id_label = self._node_id_label(node)
-                
-                # draw line to corner leading to parent                  
-                branch = self.dwg.path("M%f,%f" % (node.x, node.y), 
-                                        id=id_label)
-                branch.fill(color='none')
-                branch.stroke(color='black', width=self.branch_width)
-                branch.push("L%f,%f" % (node.corner_x, node.corner_y))
-                
-                # draw arc to parent
-                angle_dir = '+'
-                if (node.angle - node.parent_node.angle) % 360 <= 180:
-                    # child node is further clockwise than parent so must
-                    # draw angle counter-clockwise (i.e., negative) direction
-                    angle_dir = '-'
-                    
-                branch.push_arc(target=(node.parent_node.x, node.parent_node.y), 
-                                rotation=0, 
-                                r=node.parent_node.rel_depth,
-                                large_arc=False,
-                                angle_dir=angle_dir,
-                                absolute=True)
-                branch_group.add(branch)
-                
-                if node.is_collapsed_root:
-                    self._render_collapsed_circular(tree, node, collapsed_group, collapsed_text_group)
-            else:
-                # take special care of root
-                pass
+        ft = tree.flat
+        node_ids = self._branch_nodes(tree)
+        parent_ids = ft.parent[node_ids]
+        
+        # draw arc to parent in positive direction unless child node is
+        # further clockwise than parent, in which case the arc must be
+        # drawn in the counter-clockwise (i.e., negative) direction
+        sweep = ((ft.angle[node_ids] - ft.angle[parent_ids]) % 360 > 180)
+        
+        # draw line to corner leading to parent and arc to parent
+        r = ft.rel_depth[parent_ids]
+        coords = np_column_stack((ft.x[node_ids], ft.y[node_ids],
+                                    ft.corner_x[node_ids], ft.corner_y[node_ids],
+                                    r, r, sweep,
+                                    ft.x[parent_ids], ft.y[parent_ids]))
+        self._render_branches(tree, 
+                                node_ids, 
+                                format_path_data('M%f,%f L%f,%f A%f,%f 0 0,%d %f,%f', 
+                                                    coords, 
+                                                    self.dwg.coordinate_precision), 
+                                branch_group)
+        
+        collapsed_sides = self._collapsed_side_lengths(tree)
+        for node_id in node_ids[ft.is_collapsed_root[node_ids]]:
+            self._render_collapsed_circular(tree, node_id, collapsed_sides[node_id], collapsed_group, collapsed_text_group)
                 
-    def _render_collapsed_rectangular(self, tree, node, collapsed_group, collapsed_text_group):
+    def _render_collapsed_rectangular(self, tree, node_id, sides, collapsed_group, collapsed_text_group):
         """Render collapsed lineage in rectangular tree."""
 
-        side1, side2 = self._collapsed_side_lengths(tree, node)
+        side1, side2 = sides
 
         # render collapsed lineage
-        _support, taxon, _aux_info = parse_label(node.label)
-        lineage_name, color, alpha, stroke_width, stroke_color = self.collapse_map[node]
+        ft = tree.flat
+        lineage_name, color, alpha, stroke_width, stroke_color = self.collapse_map[node_id]
+        
+        node_x = float(ft.x[node_id])
+        node_y = float(ft.y[node_id])
+        half_height = 0.5*float(ft.collapsed_height[node_id])
 
         pts = []
-        pts.append((node.x, node.y+0.5*node.collapsed_height))
-        pts.append((node.x, node.y-0.5*node.collapsed_height))
-        pts.append((node.x + side1, node.y-0.5*node.collapsed_height))
-        pts.append((node.x + side2, node.y+0.5*node.collapsed_height))
+        pts.append((node_x, node_y+half_height))
+        pts.append((node_x, node_y-half_height))
+        pts.append((node_x + side1, node_y-half_height))
+        pts.append((node_x + side2, node_y+half_height))
         
-        p = self.dwg.polygon(points=pts, id='collapsed_%s' % lineage_name.replace(' ', '_'))
+        p = self.dwg.polygon(points=round_coords(pts, self.dwg.coordinate_precision), 
+                                id='collapsed_%s' % lineage_name.replace(' ', '_'))
         p.fill(color=color, opacity=alpha)
         p.stroke(color=stroke_color, width=stroke_width)
         collapsed_group.add(p)
         
-        if self.collapse_show_labels:
-            if self.collapse_label_position == 'INTERNAL':
-                label_x = node.x + 0.01*self.inch
-            elif self.collapse_label_position == 'EXTERNAL':
-                label_x = max(node.x + side1, node.x + side2)
-               
-            label = lineage_name
-            if self.collapse_show_leaf_count:
-               label += ' [%d]' % node.num_leaves
-            
-            render_label(self.dwg, 
-                            label_x, 
-                            node.y, 
-                            0, 
-                            label, 
-                            self.collapse_font_size, 
-                            self.collapse_font_color,
-                            middle_y=True,
-                            group=collapsed_text_group)
+        self._render_collapsed_label(tree, node_id, sides, collapsed_text_group)
                 
     def _render_rectangular(self, tree):
         """Render rectangular tree."""
         
-        branch_group = svgwrite.container.Group(id='branches')
+        branch_group = self.dwg.g(id='branches')
         self.dwg.add(branch_group)
         
-        collapsed_group = svgwrite.container.Group(id='collapsed_lineages')
+        collapsed_group = self.dwg.g(id='collapsed_lineages')
         self.dwg.add(collapsed_group)
         
-        collapsed_text_group = svgwrite.container.Group(id='collapsed_lineages_text')
+        collapsed_text_group = self.dwg.g(id='collapsed_lineages_text')
         self.dwg.add(collapsed_text_group)
         
         # draw all tree branches
-        for node in tree.postorder_node_iter():
-            if node == tree.seed_node:
-                continue
-                
-            if node.is_collapsed:
-                continue
-                
-            # draw line from node to corner
-            id_label = self._node_id_label(node)
-            branch = self.dwg.path("M%f,%f" % (node.x, node.y), id=id_label)
-            branch.fill(color='none')
-            branch.stroke(color='black', width=self.branch_width)
-            branch.push("L%f,%f" % (node.corner_x, node.corner_y))
-                  
-            # draw line from corner to parent
-            branch.push("L%f,%f" % (node.parent_node.x, node.parent_node.y))
-            branch_group.add(branch)
-            
-            if node.is_collapsed_root:
-                self._render_collapsed_rectangular(tree, node, collapsed_group, collapsed_text_group)
+        ft = tree.flat
+        node_ids = self._branch_nodes(tree)
+        parent_ids = ft.parent[node_ids]
+        
+        # draw line from node to corner and from corner to parent
+        coords = np_column_stack((ft.x[node_ids], ft.y[node_ids],
+                                    ft.corner_x[node_ids], ft.corner_y[node_ids],
+                                    ft.x[parent_ids], ft.y[parent_ids]))
+        self._render_branches(tree, 
+                                node_ids, 
+                                format_path_data('M%f,%f L%f,%f L%f,%f', 
+                                                    coords, 
+                                                    self.dwg.coordinate_precision), 
+                                branch_group)
+        
+        collapsed_sides = self._collapsed_side_lengths(tree)
+        for node_id in node_ids[ft.is_collapsed_root[node_ids]]:
+            self._render_collapsed_rectangular(tree, node_id, collapsed_sides[node_id], collapsed_group, collapsed_text_group)
 
     def render(self, tree):
         """Render tree in x,y plane."""
@@ -841,29 +881,37 @@ class TreeProps:
         # but rounded to first significant figure
         scalebar_width_bl = self._scale_width_bl(tree.deepest_node)
         scalebar_width = (scalebar_width_bl / tree.deepest_node) * self.width
+        
+        tick_offset = 0.5*self.scale_bar_width+0.02*self.inch
+        bar_pts = round_coords([(scalebarX, scalebarY), 
+                                (scalebarX+scalebar_width, scalebarY),
+                                (scalebarX, scalebarY-tick_offset),
+                                (scalebarX, scalebarY+tick_offset),
+                                (scalebarX+scalebar_width, scalebarY-tick_offset),
+                                (scalebarX+scalebar_width, scalebarY+tick_offset)],
+                                self.dwg.coordinate_precision)
 
         # draw scale bar
-        scale_group = svgwrite.container.Group(id='scale')
+        scale_group = self.dwg.g(id='scale')
         self.dwg.add(scale_group)
-        bar = self.dwg.line(start=(scalebarX, scalebarY), 
-                                    end=(scalebarX+scalebar_width, scalebarY), 
+        bar = self.dwg.line(start=bar_pts[0], 
+                                    end=bar_pts[1], 
                                     fill='black', 
                                     stroke_width=self.scale_bar_width,
                                     id='scale_bar')
         bar.stroke(color='black')
         scale_group.add(bar)
         
-        tick_offset = 0.5*self.scale_bar_width+0.02*self.inch
-        left_tick = self.dwg.line(start=(scalebarX, scalebarY-tick_offset), 
-                                    end=(scalebarX, scalebarY+tick_offset), 
+        left_tick = self.dwg.line(start=bar_pts[2], 
+                                    end=bar_pts[3], 
                                     fill='black', 
                                     stroke_width=self.scale_bar_width,
                                     id='scale-left-tick')
         left_tick.stroke(color='black')
         scale_group.add(left_tick)
         
-        right_tick = self.dwg.line(start=(scalebarX+scalebar_width, scalebarY-tick_offset), 
-                                    end=(scalebarX+scalebar_width, scalebarY+tick_offset), 
+        right_tick = self.dwg.line(start=bar_pts[4], 
+                                    end=bar_pts[5], 
                                     fill='black', 
                                     stroke_width=self.scale_bar_width,
                                     id='scale-right-tick')
@@ -900,23 +948,28 @@ class TreeProps:
         scalebar_width_bl = self._scale_width_bl(tree.deepest_node)
         scalebar_width = (scalebar_width_bl / tree.deepest_node) * self.height
         
-        scaleline_group = svgwrite.container.Group(id='scale_lines')
+        scaleline_group = self.dwg.g(id='scale_lines')
         self.dwg.add(scaleline_group)
 
+        precision = self.dwg.coordinate_precision
         radius = scalebar_width
         max_radius = self.width
         color_index = 0
         line_index = 0
         while radius < max_radius:
             if tree.display_method == 'CIRCULAR':
-                c = self.dwg.circle(center=(tree.start_x, tree.start_y), 
-                                    r=radius,
+                center = round_coords((tree.start_x, tree.start_y), precision)
+                c = self.dwg.circle(center=center, 
+                                    r=round_coords(radius, precision),
                                     id='scale_line_%d' % line_index)
             elif tree.display_method == 'RECTANGULAR':
                 border_x = 0.5*(self.dwg.canvas_width - self.width)
                 border_y = 0.5*(self.dwg.canvas_height - self.height)
-                c = self.dwg.line((border_x+radius, border_y),
-                                    (border_x+radius, self.dwg.canvas_height - border_y),
+                start, end = round_coords([(border_x+radius, border_y),
+                                            (border_x+radius, self.dwg.canvas_height - border_y)],
+                                            precision)
+                c = self.dwg.line(start,
+                                    end,
                                     id='scale_line_%d' % line_index)
                                     
             c.fill('none')
@@ -0,0 +1,66 @@
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = 'Donovan Parks'
+__copyright__ = 'Copyright 2016'
+__credits__ = ['Donovan Parks']
+__license__ = 'GPL3'
+__version__ = '0.0.1'
+__maintainer__ = 'Donovan Parks'
+__email__ = 'donovan.parks@gmail.com'
+__status__ = 'Development'
+
+from numpy import array as np_array
+
+
+def cladogram(ft):
+    """Branch lengths forming a cladogram.
+
+    Each node is placed at a height equal to the number of
+    branches between it and its most distant descendant leaf,
+    so all leaves are equidistant from the root.
+
+    Parameters
+    ----------
+    ft : FlatTree
+      Flattened tree.
+
+    Returns
+    -------
+    ndarray
+      Length of branch above each node in preorder.
+    """
+
+    # height of each node, accumulated from the
+    # leaves up by walking preorder backwards
+    height = [0] * ft.num_nodes
+    parent = ft.parent.tolist()
+    for node_id in xrange(ft.num_nodes - 1, 0, -1):
+        p = parent[node_id]
+        if height[node_id] + 1 > height[p]:
+            height[p] = height[node_id] + 1
+
+    height = np_array(height, dtype=float)
+    edge_length = height[ft.parent] - height
+    edge_length[0] = 0.0
+
+    return edge_length
+
+
+# transformations of branch lengths applied
+# to a tree before it is laid out
+branch_transformations = {'CLADOGRAM': cladogram}
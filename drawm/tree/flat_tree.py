@@ -0,0 +1,346 @@
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = 'Donovan Parks'
+__copyright__ = 'Copyright 2016'
+__credits__ = ['Donovan Parks']
+__license__ = 'GPL3'
+__version__ = '0.0.1'
+__maintainer__ = 'Donovan Parks'
+__email__ = 'donovan.parks@gmail.com'
+__status__ = 'Development'
+
+from numpy import (array as np_array,
+                    asarray as np_asarray,
+                    zeros as np_zeros,
+                    ones as np_ones,
+                    empty as np_empty,
+                    arange as np_arange,
+                    cumsum as np_cumsum,
+                    repeat as np_repeat,
+                    lexsort as np_lexsort,
+                    floor as np_floor,
+                    minimum as np_minimum,
+                    nan as np_nan,
+                    flatnonzero as np_flatnonzero)
+
+from drawm.tree.lca import LCAIndex
+from drawm.tree.newick_utils import parse_label
+
+
+class FlatTree(object):
+    """Flattened, array-backed representation of a tree.
+
+    Nodes are stored in preorder so the root is at index 0 and the
+    descendants of node i occupy the contiguous block of indices
+    [i, i + subtree_size[i]). Topology is held in parent, first child,
+    and next sibling index arrays (-1 if undefined) and all per-node
+    properties required for drawing the tree are held in NumPy columns
+    indexed by node. The id attribute of each dendropy node is set to
+    its index in these arrays.
+    """
+
+    def __init__(self, tree):
+        """Flatten tree.
+
+        Parameters
+        ----------
+        tree : Tree
+          Dendropy tree to flatten.
+        """
+
+        nodes = list(tree.preorder_node_iter())
+        for node_id, node in enumerate(nodes):
+            node.id = node_id
+
+        num_nodes = len(nodes)
+        parent = [-1] * num_nodes
+        first_child = [-1] * num_nodes
+        next_sibling = [-1] * num_nodes
+        edge_length = [0.0] * num_nodes
+        for node_id, node in enumerate(nodes):
+            if node.parent_node is not None:
+                parent[node_id] = node.parent_node.id
+                if node.edge.length:
+                    edge_length[node_id] = node.edge.length
+
+            prev_child = -1
+            for c in node.child_node_iter():
+                if prev_child == -1:
+                    first_child[node_id] = c.id
+                else:
+                    next_sibling[prev_child] = c.id
+                prev_child = c.id
+
+        # distance from root and topological depth of each node,
+        # filled in a single pass as parents precede children in preorder
+        root_dist = [0.0] * num_nodes
+        depth = [0] * num_nodes
+        for node_id in xrange(1, num_nodes):
+            p = parent[node_id]
+            root_dist[node_id] = root_dist[p] + edge_length[node_id]
+            depth[node_id] = depth[p] + 1
+
+        # size of subtree and number of leaves below each node,
+        # accumulated from the leaves up by walking preorder backwards
+        subtree_size = [1] * num_nodes
+        num_leaves = [int(c == -1) for c in first_child]
+        for node_id in xrange(num_nodes - 1, 0, -1):
+            p = parent[node_id]
+            subtree_size[p] += subtree_size[node_id]
+            num_leaves[p] += num_leaves[node_id]
+
+        self.nodes = nodes
+        self.num_nodes = num_nodes
+
+        self.parent = np_array(parent, dtype=int)
+        self.first_child = np_array(first_child, dtype=int)
+        self.next_sibling = np_array(next_sibling, dtype=int)
+        self.edge_length = np_array(edge_length, dtype=float)
+        self.root_dist = np_array(root_dist, dtype=float)
+        self.depth = np_array(depth, dtype=int)
+
+        self.is_leaf = (self.first_child == -1)
+        self.subtree_size = np_array(subtree_size, dtype=int)
+        self.num_leaves = np_array(num_leaves, dtype=int)
+
+        self.leaves = np_flatnonzero(self.is_leaf)
+
+        # leaves below node i are leaves[leaf_start[i]:leaf_start[i] + num_leaves[i]]
+        self.leaf_start = np_cumsum(self.is_leaf) - self.is_leaf
+        self.deepest_leaf = self._deepest_leaves()
+
+        # a node is preceded in postorder by every node before it in
+        # preorder except its ancestors, along with its own descendants
+        post_rank = np_arange(num_nodes) - self.depth + self.subtree_size - 1
+        self.postorder = np_empty(num_nodes, dtype=int)
+        self.postorder[post_rank] = np_arange(num_nodes)
+
+        # layout of nodes in x,y plane
+        self.angle = np_zeros(num_nodes)
+        self.x_dir = np_ones(num_nodes)
+        self.y_dir = np_zeros(num_nodes)
+        self.x = np_zeros(num_nodes)
+        self.y = np_zeros(num_nodes)
+        self.corner_x = np_zeros(num_nodes)
+        self.corner_y = np_zeros(num_nodes)
+        self.rel_depth = np_zeros(num_nodes)
+
+        # collapsed lineages
+        self.is_collapsed = np_zeros(num_nodes, dtype=bool)
+        self.is_collapsed_root = np_zeros(num_nodes, dtype=bool)
+        self.collapse_root = -np_ones(num_nodes, dtype=int)
+        self.collapsed_angle = np_zeros(num_nodes)
+        self.collapsed_height = np_zeros(num_nodes)
+
+        # value used to contour tree (NaN if undefined)
+        self.contour = np_empty(num_nodes)
+        self.contour.fill(np_nan)
+
+        self._parse_labels()
+        self.label_index = self._label_index()
+        self._lca_index = None
+
+    def _deepest_leaves(self):
+        """Find leaf furthest from the root below each node.
+
+        Ties are resolved in favour of the first leaf in tree order.
+
+        Returns
+        -------
+        ndarray
+          Index of deepest leaf below each node.
+        """
+
+        deepest = [node_id if c == -1 else -1 for node_id, c in enumerate(self.first_child.tolist())]
+        parent = self.parent.tolist()
+        root_dist = self.root_dist.tolist()
+        for node_id in xrange(self.num_nodes - 1, 0, -1):
+            p = parent[node_id]
+            leaf_id = deepest[node_id]
+            if deepest[p] == -1 or root_dist[leaf_id] >= root_dist[deepest[p]]:
+                deepest[p] = leaf_id
+
+        return np_array(deepest, dtype=int)
+
+    def _parse_labels(self):
+        """Decode labels of all nodes.
+
+        Internal nodes are decoded from their Newick label and leaves from
+        the label of their taxon. Sets the support column (NaN if undefined),
+        along with the taxon, taxonomy (list of semicolon-separated taxa),
+        and auxiliary information of each node (None if undefined).
+        """
+
+        support = [np_nan] * self.num_nodes
+        self.taxon = [None] * self.num_nodes
+        self.taxonomy = [[]] * self.num_nodes
+        self.aux_info = [None] * self.num_nodes
+        for node_id, node in enumerate(self.nodes):
+            if self.first_child[node_id] == -1:
+                if node.taxon is None:
+                    continue
+                _support, taxon, aux_info = parse_label(node.taxon.label)
+            else:
+                node_support, taxon, aux_info = parse_label(node.label)
+                if node_support is not None:
+                    support[node_id] = node_support
+
+            self.aux_info[node_id] = aux_info
+            if taxon:
+                self.taxon[node_id] = taxon
+                self.taxonomy[node_id] = taxon.split(';')
+
+        self.support = np_array(support, dtype=float)
+
+    def _label_index(self):
+        """Map leaf labels and taxa in internal labels to node indices.
+
+        Leaf labels take precedence over internal labels and otherwise
+        the first node in preorder with a given taxon is retained.
+
+        Returns
+        -------
+        dict : str -> int
+            Index of node associated with each label.
+        """
+
+        label_index = {}
+        for leaf_id in self.leaves:
+            taxon = self.nodes[leaf_id].taxon
+            if taxon is not None:
+                label_index.setdefault(taxon.label, leaf_id)
+
+        for node_id in np_flatnonzero(~self.is_leaf):
+            for taxon in self.taxonomy[node_id]:
+                label_index.setdefault(taxon, node_id)
+
+        return label_index
+
+    def set_edge_lengths(self, edge_length):
+        """Set length of branch above each node.
+
+        Distances from the root are updated to reflect the new
+        branch lengths, as are the edges of the dendropy tree.
+
+        Parameters
+        ----------
+        edge_length : array_like
+          Length of branch above each node in preorder.
+        """
+
+        edge_length = np_array(edge_length, dtype=float)
+
+        root_dist = [0.0] * self.num_nodes
+        parent = self.parent.tolist()
+        lengths = edge_length.tolist()
+        for node_id in xrange(1, self.num_nodes):
+            root_dist[node_id] = root_dist[parent[node_id]] + lengths[node_id]
+            self.nodes[node_id].edge.length = lengths[node_id]
+
+        self.edge_length = edge_length
+        self.root_dist = np_array(root_dist, dtype=float)
+        self.deepest_leaf = self._deepest_leaves()
+
+    def tip_dist_percentiles(self, node_ids, percentiles):
+        """Percentiles of distances from nodes to leaves in their subtrees.
+
+        Leaves are held in preorder so the distances from a node to
+        its leaves are a contiguous slice of leaf distances from the root,
+        less the distance of the node from the root. Slices for all nodes
+        are sorted together and percentiles read off with the linear
+        interpolation used by numpy.percentile.
+
+        Parameters
+        ----------
+        node_ids : array_like
+          Indices of nodes.
+        percentiles : array_like
+          Percentiles to compute, between 0 and 100.
+
+        Returns
+        -------
+        ndarray
+          Percentiles for each node (rows) and percentile (columns).
+        """
+
+        node_ids = np_asarray(node_ids, dtype=int)
+        percentiles = np_asarray(percentiles, dtype=float)
+        if len(node_ids) == 0:
+            return np_zeros((0, len(percentiles)))
+
+        # gather distances to leaves of each node into consecutive blocks
+        num_leaves = self.num_leaves[node_ids]
+        block_start = np_cumsum(num_leaves) - num_leaves
+        block = np_repeat(np_arange(len(node_ids)), num_leaves)
+        leaf_pos = np_arange(num_leaves.sum()) - block_start[block] + self.leaf_start[node_ids][block]
+        tip_dist = self.root_dist[self.leaves[leaf_pos]] - self.root_dist[node_ids][block]
+
+        # sort distances within each block
+        tip_dist = tip_dist[np_lexsort((tip_dist, block))]
+
+        rank = (percentiles / 100.0) * (num_leaves[:, None] - 1)
+        lower_rank = np_floor(rank)
+        lower_idx = lower_rank.astype(int)
+        upper_idx = np_minimum(lower_idx + 1, num_leaves[:, None] - 1)
+        lower = tip_dist[block_start[:, None] + lower_idx]
+        upper = tip_dist[block_start[:, None] + upper_idx]
+
+        return lower + (upper - lower) * (rank - lower_rank)
+
+    def lca_index(self):
+        """LCA index for tree, built on first use."""
+
+        if self._lca_index is None:
+            self._lca_index = LCAIndex(self.parent, self.depth)
+
+        return self._lca_index
+
+    def children(self, node_id):
+        """Iterate over indices of children of a node."""
+
+        c = self.first_child[node_id]
+        while c != -1:
+            yield c
+            c = self.next_sibling[c]
+
+    def subtree_end(self, node_id):
+        """Index one past the last node in the subtree of a node."""
+
+        return node_id + self.subtree_size[node_id]
+
+    def leaf_range(self, node_id):
+        """Range of positions in leaves spanned by the subtree of a node."""
+
+        start = self.leaf_start[node_id]
+        return start, start + self.num_leaves[node_id]
+
+    def first_leaf(self, node_id):
+        """Index of first leaf in subtree of a node."""
+
+        return self.leaves[self.leaf_start[node_id]]
+
+    def last_leaf(self, node_id):
+        """Index of last leaf in subtree of a node."""
+
+        return self.leaves[self.leaf_start[node_id] + self.num_leaves[node_id] - 1]
+
+    def leaf_indices(self, node_id):
+        """Indices of leaves in subtree of a node, in tree order."""
+
+        start, end = self.leaf_range(node_id)
+        return self.leaves[start:end]
@@ -0,0 +1,139 @@
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = 'Donovan Parks'
+__copyright__ = 'Copyright 2016'
+__credits__ = ['Donovan Parks']
+__license__ = 'GPL3'
+__version__ = '0.0.1'
+__maintainer__ = 'Donovan Parks'
+__email__ = 'donovan.parks@gmail.com'
+__status__ = 'Development'
+
+from numpy import (arange as np_arange,
+                    asarray as np_asarray,
+                    minimum as np_minimum,
+                    maximum as np_maximum,
+                    empty as np_empty,
+                    where as np_where,
+                    frexp as np_frexp,
+                    unique as np_unique)
+
+
+class LCAIndex(object):
+    """Constant time lowest common ancestor (LCA) queries.
+
+    Nodes must be indexed in preorder. For nodes u < v, the shallowest
+    node in the preorder interval (u, v] is a child of LCA(u, v), so the
+    LCA is found with a range minimum query over node depths. This plays
+    the role of the Euler tour in the classic reduction, but requires no
+    additional traversal of the tree. Range minimum queries are answered
+    in constant time with a sparse table built in O(n log n).
+    """
+
+    def __init__(self, parent, depth):
+        """Build sparse table.
+
+        Parameters
+        ----------
+        parent : ndarray
+          Index of parent of each node in preorder (-1 for root).
+        depth : ndarray
+          Topological depth of each node in preorder.
+        """
+
+        self.parent = parent
+        self.depth = depth
+
+        # table[k][i] is index of shallowest node in [i, i + 2^k)
+        num_nodes = len(depth)
+        self.table = [np_arange(num_nodes)]
+        k = 1
+        while (1 << k) <= num_nodes:
+            prev = self.table[-1]
+            num_entries = num_nodes - (1 << k) + 1
+            half = 1 << (k - 1)
+            left = prev[0:num_entries]
+            right = prev[half:half + num_entries]
+            self.table.append(np_where(depth[left] <= depth[right], left, right))
+            k += 1
+
+    def mrca_pairs(self, u, v):
+        """Find LCA of each pair of nodes.
+
+        Parameters
+        ----------
+        u : array_like
+          Index of first node in each pair.
+        v : array_like
+          Index of second node in each pair.
+
+        Returns
+        -------
+        ndarray
+          Index of LCA of each pair of nodes.
+        """
+
+        u = np_asarray(u, dtype=int)
+        v = np_asarray(v, dtype=int)
+
+        # query interval is [start, end), with end > start
+        # for all pairs of distinct nodes
+        start = np_minimum(u, v) + 1
+        end = np_maximum(u, v) + 1
+        distinct = (u != v)
+
+        mrca = u.copy()
+        start = start[distinct]
+        end = end[distinct]
+        if len(start) == 0:
+            return mrca
+
+        # largest power of two not exceeding length of each interval
+        _mantissa, exponent = np_frexp(end - start)
+        level = exponent - 1
+
+        shallowest = np_empty(len(start), dtype=int)
+        for k in np_unique(level):
+            mask = (level == k)
+            left = self.table[k][start[mask]]
+            right = self.table[k][end[mask] - (1 << k)]
+            shallowest[mask] = np_where(self.depth[left] <= self.depth[right], left, right)
+
+        mrca[distinct] = self.parent[shallowest]
+
+        return mrca
+
+    def mrca(self, node_ids):
+        """Find LCA of a set of nodes.
+
+        The LCA of a set of nodes is the LCA of the first
+        and last of these nodes in preorder.
+
+        Parameters
+        ----------
+        node_ids : iterable
+          Indices of nodes.
+
+        Returns
+        -------
+        int
+          Index of LCA of nodes.
+        """
+
+        node_ids = np_asarray(node_ids, dtype=int)
+        return self.mrca_pairs([node_ids.min()], [node_ids.max()])[0]
@@ -25,146 +25,200 @@ __email__ = 'donovan.parks@gmail.com'
 __status__ = 'Development'
 
 
-from drawm.tree.newick_utils import parse_label
+from numpy import (array as np_array,
+                    isnan as np_isnan)
 
 
-def find_node(tree, label):
-    """Find node in tree."""
-    
-    if '|' in label:
-        try:
-            node = tree.mrca(taxon_labels=label.split('|'))
-        except:
-            node = None
-    else:
-        node = tree.find_node_with_taxon_label(label)
-        if not node:
-            for n in tree.preorder_internal_node_iter():
-                _support, taxon, _aux_info = parse_label(n.label)
-                if taxon and label in taxon.split(';'):
-                    node = n
-                    break
-                    
-    return node
+def find_nodes(tree, labels):
+    """Find nodes in tree.
     
-
-def dist_to_ancestor(child, ancestor):
-    """Calculate distance from child node to ancestor node."""
+    Leaf labels and taxa within internal labels are resolved
+    with the label index of the flattened tree, while labels
+    of the form 'a|b' indicate the MRCA of the specified taxa.
+    The MRCA of all such labels are found in a single batch.
     
-    d = 0.0
-    cur_node = child
-    while cur_node != ancestor:
-        d += cur_node.edge.length
-        cur_node = cur_node.parent_node
+    Parameters
+    ----------
+    tree : Tree
+        Tree with flattened representation.
+    labels : iterable
+        Labels to resolve.
+        
+    Returns
+    -------
+    ndarray
+        Index of node for each label, or -1 if not found.
+    """
     
-    return d
+    label_index = tree.flat.label_index
+    
+    node_ids = []
+    first_ids = []
+    last_ids = []
+    mrca_rows = []
+    for row, label in enumerate(labels):
+        if '|' in label:
+            # placeholder until MRCA is resolved
+            node_ids.append(-1)
+            taxa_ids = [label_index.get(taxon) for taxon in label.split('|')]
+            if None not in taxa_ids:
+                first_ids.append(min(taxa_ids))
+                last_ids.append(max(taxa_ids))
+                mrca_rows.append(row)
+        else:
+            node_ids.append(label_index.get(label, -1))
+            
+    node_ids = np_array(node_ids, dtype=int)
+    if mrca_rows:
+        lca = tree.flat.lca_index()
+        node_ids[mrca_rows] = lca.mrca_pairs(first_ids, last_ids)
+                    
+    return node_ids
+
 
+def mean_tip_dist(tree):
+    """Calculate mean distance from each node to the leaves in its subtree.
     
-def decorate_mean_branch_length(tree):
-    """Decorate tree with mean branch length to tips (mean_tip_bl)."""
+    Summed distances to leaves are accumulated from the leaves up
+    by walking preorder backwards, which is equivalent to a postorder
+    traversal of the tree.
     
-    for node in tree.preorder_node_iter():
-        if node.is_leaf():
-            node.mean_tip_bl = 0.0
-            continue
-            
-        # check if node meets mean branch length criterion
-        dists_to_tips = []
-        for t in node.leaf_iter():
-            dists_to_tips.append(dist_to_ancestor(t, node))
-            
-        node.mean_tip_bl = np_mean(dists_to_tips)
+    Parameters
+    ----------
+    tree : Tree
+      Tree with flattened representation.
       
+    Returns
+    -------
+    ndarray
+      Mean distance to leaves for each node in preorder.
+    """
+    
+    ft = tree.flat
+    
+    sum_dist = [0.0] * ft.num_nodes
+    parent = ft.parent.tolist()
+    num_leaves = ft.num_leaves.tolist()
+    edge_length = ft.edge_length.tolist()
+    for node_id in xrange(ft.num_nodes - 1, 0, -1):
+        sum_dist[parent[node_id]] += sum_dist[node_id] + num_leaves[node_id] * edge_length[node_id]
+        
+    return np_array(sum_dist) / ft.num_leaves
 
-"""THESE NEED TO BE REMOVED OR SPECIFIED AS A VISUAL PROPERTY."""      
-def _render_mean_tip_bl(self, tree, test_dist):
-    """Render mean branch length to extent taxa (root to tip)."""
 
-    contour_pts = []
-    stack = [tree.seed_node]
-    while stack:
-        node = stack.pop()
-                         
-        # check if node meets mean branch length criterion
-        if node.mean_tip_bl > test_dist:
-            # node is above threshold so add children
-            for c in node.child_node_iter():
-                stack.append(c)
+def relative_divergence(tree):
+    """Calculate relative evolutionary divergence (RED) of each node.
+    
+    The root has a RED of 0 and leaves a RED of 1. Each internal
+    node is placed between its parent and its extant taxa in proportion 
+    to the length of its parent branch relative to the mean distance 
+    from its parent to these taxa. Values are filled in a single pass
+    as parents precede children in preorder.
+    
+    Parameters
+    ----------
+    tree : Tree
+      Tree with flattened representation.
+      
+    Returns
+    -------
+    ndarray
+      RED of each node in preorder.
+    """
+    
+    ft = tree.flat
+    
+    mean_dist = mean_tip_dist(tree).tolist()
+    parent = ft.parent.tolist()
+    is_leaf = ft.is_leaf.tolist()
+    edge_length = ft.edge_length.tolist()
+    
+    red = [0.0] * ft.num_nodes
+    for node_id in xrange(1, ft.num_nodes):
+        if is_leaf[node_id]:
+            red[node_id] = 1.0
             continue
-        else:
-            # first node in lineage below threhold so
-            # draw contour along this branch
-            bl = node.mean_tip_bl
-            pbl = node.parent_node.mean_tip_bl
             
-            index = 0
-            if bl != pbl:
-                index = float(pbl - test_dist) / (pbl - bl)
+        p = parent[node_id]
+        dist_to_tips = edge_length[node_id] + mean_dist[node_id]
+        if dist_to_tips > 0:
+            red[node_id] = red[p] + (edge_length[node_id] / dist_to_tips) * (1.0 - red[p])
+        else:
+            red[node_id] = red[p]
+        
+    return np_array(red)
 
-            x = node.corner_x + index * (node.x - node.corner_x)
-            y = node.corner_y + index * (node.y - node.corner_y)
-                
-            contour_pts.append((x, y))
 
-    # draw contour
-    path = self.dwg.path("M%d,%d" % contour_pts[0])
-    path.fill(color='none', opacity=0.5, rule='evenodd')
-    path.stroke(color='red', width=1)
-    
-    c = self.dwg.circle(center=contour_pts[0], r=self.node_radius)
-    c.stroke(color='black')
-    c.fill(color='red')
-    c = self.dwg.add(c)
-    
-    # draw contour
-    for pt in contour_pts[1:]:
-        path.push("L%d,%d" % pt)
-        
-        c = self.dwg.circle(center=pt, r=self.node_radius)
-        c.stroke(color='black')
-        c.fill(color='red')
-        c = self.dwg.add(c)
-        
-    self.dwg.add(path)
+def interpolate_node_values(tree, values):
+    """Fill in undefined node values from annotated ancestors and descendants.
+    
+    Undefined values are linearly interpolated, by distance from the root,
+    between the value of the closest annotated ancestor and the mean value 
+    of the closest annotated descendants. Nodes with only annotated
+    ancestors or only annotated descendants take the value of these nodes,
+    and nodes with neither remain undefined.
+    
+    Parameters
+    ----------
+    tree : Tree
+      Tree with flattened representation.
+    values : ndarray
+      Value of each node in preorder (NaN if undefined).
+      
+    Returns
+    -------
+    ndarray
+      Value of each node in preorder.
+    """
+    
+    ft = tree.flat
+    
+    defined = (~np_isnan(values)).tolist()
+    values = values.tolist()
+    parent = ft.parent.tolist()
+    root_dist = ft.root_dist.tolist()
+    
+    # closest annotated descendants of each node, 
+    # accumulated from the leaves up
+    below_value = [0.0] * ft.num_nodes
+    below_dist = [0.0] * ft.num_nodes
+    below_count = [0] * ft.num_nodes
+    for node_id in xrange(ft.num_nodes - 1, 0, -1):
+        p = parent[node_id]
+        if defined[node_id]:
+            below_value[p] += values[node_id]
+            below_dist[p] += root_dist[node_id]
+            below_count[p] += 1
+        else:
+            below_value[p] += below_value[node_id]
+            below_dist[p] += below_dist[node_id]
+            below_count[p] += below_count[node_id]
             
-def _render_mean_tip_bl_test(self, tree, test_dist):
-    """Render mean branch length to extent taxa."""
-
-    contour_pts = []
-    for node in tree.preorder_node_iter():
-        if not node.parent_node:
+    # closest annotated ancestor of each node, 
+    # filled from the root down
+    filled = list(values)
+    above = [-1] * ft.num_nodes
+    for node_id in xrange(ft.num_nodes):
+        if node_id != 0:
+            p = parent[node_id]
+            above[node_id] = p if defined[p] else above[p]
+            
+        if defined[node_id]:
             continue
             
-        bl = node.mean_tip_bl
-        pbl = node.parent_node.mean_tip_bl
-        
-        index = 0
-        if bl <= test_dist <= pbl:
-            if bl != pbl:
-                index = float(pbl - test_dist) / (pbl - bl)
-
-            x = node.corner_x + index * (node.x - node.corner_x)
-            y = node.corner_y + index * (node.y - node.corner_y)
-                
-            contour_pts.append((x, y))
-
-    # draw contour
-    path = self.dwg.path("M%d,%d" % contour_pts[0])
-    path.fill(color='none', opacity=0.5, rule='evenodd')
-    path.stroke(color='green', width=1)
-    
-    c = self.dwg.circle(center=contour_pts[0], r=self.node_radius)
-    c.stroke(color='black')
-    c.fill(color='green')
-    c = self.dwg.add(c)
-    
-    # draw contour
-    for pt in contour_pts[1:]:
-        path.push("L%d,%d" % pt)
-        
-        c = self.dwg.circle(center=pt, r=self.node_radius)
-        c.stroke(color='black')
-        c.fill(color='green')
-        c = self.dwg.add(c)
-        
-    self.dwg.add(path)
\ No newline at end of file
+        a = above[node_id]
+        count = below_count[node_id]
+        if a != -1 and count:
+            mean_value = below_value[node_id] / count
+            span = below_dist[node_id] / count - root_dist[a]
+            if span > 0:
+                frac = (root_dist[node_id] - root_dist[a]) / span
+                filled[node_id] = values[a] + frac * (mean_value - values[a])
+            else:
+                filled[node_id] = values[a]
+        elif a != -1:
+            filled[node_id] = values[a]
+        elif count:
+            filled[node_id] = below_value[node_id] / count
+            
+    return np_array(filled)
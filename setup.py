@@ -31,4 +31,6 @@ if __name__ == '__main__':
             "dendropy>=4.0.0",
             "biolib>=0.0.32",
             "svgwrite>1.1.19"],
+        extras_require={
+            "png": ["Pillow"]},
     )